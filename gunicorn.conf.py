@@ -0,0 +1,57 @@
+# Gunicorn settings, used by Procfile and render.yml:
+#
+#     gunicorn -c gunicorn.conf.py wsgi --chdir ./src/
+#
+# Every value can be overridden with an env var (or on the command line).
+import gc
+import os
+import tempfile
+
+def env_bool(name, default):
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+def cpu_count():
+    # CPUs this process may run on, a container often sees every host CPU in cpu_count()
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# Processes: 2 x CPUs + 1, capped so small instances do not run out of memory.
+# WEB_CONCURRENCY (Heroku/Render convention) sets it directly
+workers = int(os.getenv("WEB_CONCURRENCY", min(2 * cpu_count() + 1, int(os.getenv("GUNICORN_MAX_WORKERS", 4)))))
+# Threads per worker (gthread worker when > 1). Each thread may hold one DB
+# connection, keep it below DB_POOL_SIZE + DB_MAX_OVERFLOW
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# app.py is imported once in the master and the workers are forked from it,
+# they share those memory pages instead of each one repeating the startup
+preload_app = env_bool("GUNICORN_PRELOAD", True)
+
+# More than one worker: /metrics needs a directory shared by all of them,
+# see metrics.py. Set before the app (and prometheus_client) is imported
+if workers > 1 and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+
+def pre_fork(server, worker):
+    # Objects from the preloaded app move to a generation the collector never
+    # scans, so a collection in a worker does not write to (and copy) the
+    # pages shared with the master
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Connections opened by the master must not be shared by the workers.
+    # close=False drops them from this worker's pool without closing the
+    # sockets, which still belong to the master
+    if preload_app:
+        from app import app
+        from models import db
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+def child_exit(server, worker):
+    # Drop the live gauges (in flight requests) of the dead worker
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,46 @@
+"""favorite indexes and unique (user, target) constraints
+
+Revision ID: 02b839fbbd6a
+Revises: 1956c7ed91c5
+Create Date: 2026-10-18 10:12:41.503217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '02b839fbbd6a'
+down_revision = '1956c7ed91c5'
+branch_labels = None
+depends_on = None
+
+
+def remove_duplicates(column):
+    # Keep the oldest favorite of every (user_id, column) pair so the unique
+    # constraint can be created on databases that already have duplicates
+    op.execute(
+        "DELETE FROM favorite WHERE {0} IS NOT NULL AND id NOT IN ("
+        "SELECT id FROM (SELECT MIN(id) AS id FROM favorite "
+        "WHERE {0} IS NOT NULL GROUP BY user_id, {0}) AS keep)".format(column)
+    )
+
+
+def upgrade():
+    remove_duplicates('planet_id')
+    remove_duplicates('people_id')
+    remove_duplicates('vehicle_id')
+
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_favorite_user_id'), ['user_id'], unique=False)
+        batch_op.create_unique_constraint('uq_favorite_user_planet', ['user_id', 'planet_id'])
+        batch_op.create_unique_constraint('uq_favorite_user_people', ['user_id', 'people_id'])
+        batch_op.create_unique_constraint('uq_favorite_user_vehicle', ['user_id', 'vehicle_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_favorite_user_vehicle', type_='unique')
+        batch_op.drop_constraint('uq_favorite_user_people', type_='unique')
+        batch_op.drop_constraint('uq_favorite_user_planet', type_='unique')
+        batch_op.drop_index(batch_op.f('ix_favorite_user_id'))
@@ -0,0 +1,36 @@
+"""table_version for conditional GET
+
+Revision ID: 1772a7cc4a7b
+Revises: 02b839fbbd6a
+Create Date: 2026-10-18 11:03:27.918402
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1772a7cc4a7b'
+down_revision = '02b839fbbd6a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_version = op.create_table('table_version',
+    sa.Column('name', sa.String(length=80), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    now = datetime.utcnow().replace(microsecond=0)
+    op.bulk_insert(table_version, [
+        {'name': 'people', 'version': 1, 'updated_at': now},
+        {'name': 'planet', 'version': 1, 'updated_at': now},
+        {'name': 'vehicle', 'version': 1, 'updated_at': now}
+    ])
+
+
+def downgrade():
+    op.drop_table('table_version')
@@ -0,0 +1,46 @@
+"""indexes for catalog filters and sort
+
+Revision ID: 40d714dde215
+Revises: b56ca48b746c
+Create Date: 2026-10-18 15:22:54.610937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '40d714dde215'
+down_revision = 'b56ca48b746c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('people', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_people_gender'), ['gender'], unique=False)
+        batch_op.create_index(batch_op.f('ix_people_planet_id'), ['planet_id'], unique=False)
+
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_planet_climate'), ['climate'], unique=False)
+        batch_op.create_index(batch_op.f('ix_planet_population'), ['population'], unique=False)
+        batch_op.create_index(batch_op.f('ix_planet_terrain'), ['terrain'], unique=False)
+
+    with op.batch_alter_table('vehicle', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_vehicle_name'), ['name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_vehicle_vehicle_class'), ['vehicle_class'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('vehicle', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_vehicle_vehicle_class'))
+        batch_op.drop_index(batch_op.f('ix_vehicle_name'))
+
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_planet_terrain'))
+        batch_op.drop_index(batch_op.f('ix_planet_population'))
+        batch_op.drop_index(batch_op.f('ix_planet_climate'))
+
+    with op.batch_alter_table('people', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_people_planet_id'))
+        batch_op.drop_index(batch_op.f('ix_people_gender'))
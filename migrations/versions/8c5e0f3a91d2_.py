@@ -0,0 +1,90 @@
+"""search indexes: tsvector on postgresql, fts5 on sqlite
+
+Revision ID: 8c5e0f3a91d2
+Revises: 40d714dde215
+Create Date: 2026-10-18 16:05:12.480116
+
+On SQLite the FTS5 table is kept in sync by triggers. A batch migration
+that recreates people, planet or vehicle drops their triggers, so it has
+to create them again (see create_sqlite_triggers).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c5e0f3a91d2'
+down_revision = '40d714dde215'
+branch_labels = None
+depends_on = None
+
+# Same expressions as SEARCH_DOCUMENTS in src/search.py
+POSTGRESQL_DOCUMENTS = {
+    'people': "name || ' ' || gender || ' ' || hair_color || ' ' || eye_color",
+    'planet': "name || ' ' || climate || ' ' || terrain",
+    'vehicle': "name || ' ' || model || ' ' || manufacturer || ' ' || vehicle_class"
+}
+
+# table -> (rowid code, attributes besides the name)
+SQLITE_DOCUMENTS = {
+    'people': (1, ['gender', 'hair_color', 'eye_color']),
+    'planet': (2, ['climate', 'terrain']),
+    'vehicle': (3, ['model', 'manufacturer', 'vehicle_class'])
+}
+
+
+def sqlite_body(row, attributes):
+    return " || ' ' || ".join(row + '.' + attribute for attribute in attributes)
+
+
+def create_sqlite_triggers(table):
+    # rowid = id * 4 + code, so updates and deletes find the entry by rowid
+    code, attributes = SQLITE_DOCUMENTS[table]
+    insert = (
+        "INSERT INTO search_index(rowid, name, body, type, ref_id) "
+        "VALUES (new.id * 4 + {code}, new.name, {body}, '{table}', new.id);"
+    ).format(code=code, body=sqlite_body('new', attributes), table=table)
+    delete = "DELETE FROM search_index WHERE rowid = old.id * 4 + {code};".format(code=code)
+
+    op.execute("CREATE TRIGGER {0}_search_insert AFTER INSERT ON {0} BEGIN {1} END".format(table, insert))
+    op.execute("CREATE TRIGGER {0}_search_update AFTER UPDATE ON {0} BEGIN {1} {2} END".format(table, delete, insert))
+    op.execute("CREATE TRIGGER {0}_search_delete AFTER DELETE ON {0} BEGIN {1} END".format(table, delete))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        for table, document in POSTGRESQL_DOCUMENTS.items():
+            op.execute("CREATE INDEX ix_{0}_search ON {0} USING GIN (to_tsvector('simple', {1}))".format(table, document))
+
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE search_index USING fts5("
+            "name, body, type UNINDEXED, ref_id UNINDEXED, "
+            "prefix='2 3 4', tokenize='unicode61 remove_diacritics 2')"
+        )
+        for table, (code, attributes) in SQLITE_DOCUMENTS.items():
+            op.execute(
+                "INSERT INTO search_index(rowid, name, body, type, ref_id) "
+                "SELECT id * 4 + {code}, name, {body}, '{table}', id FROM {table}".format(
+                    code=code, body=sqlite_body(table, attributes), table=table)
+            )
+            create_sqlite_triggers(table)
+
+    # Other databases search with LIKE 'prefix%' on the name indexes
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        for table in POSTGRESQL_DOCUMENTS:
+            op.execute("DROP INDEX ix_{0}_search".format(table))
+
+    elif dialect == 'sqlite':
+        for table in SQLITE_DOCUMENTS:
+            for action in ('insert', 'update', 'delete'):
+                op.execute("DROP TRIGGER {0}_search_{1}".format(table, action))
+        op.execute("DROP TABLE search_index")
@@ -0,0 +1,93 @@
+"""favorite_count counters on people, planet and vehicle
+
+Revision ID: 906cc806794a
+Revises: 8c5e0f3a91d2
+Create Date: 2026-10-18 18:40:27.318904
+
+The counters are filled from favorite. On SQLite the tables are never
+recreated (recreating people or planet breaks the foreign keys of favorite,
+the downgrade needs SQLite 3.35+ for DROP COLUMN), the search triggers of
+8c5e0f3a91d2 are only replaced to narrow the update one to the searched
+columns, otherwise every favorite would rewrite the FTS5 entry.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '906cc806794a'
+down_revision = '8c5e0f3a91d2'
+branch_labels = None
+depends_on = None
+
+# table -> favorite column
+TARGETS = {
+    'people': 'people_id',
+    'planet': 'planet_id',
+    'vehicle': 'vehicle_id'
+}
+
+# Same as SQLITE_DOCUMENTS in 8c5e0f3a91d2: table -> (rowid code, attributes besides the name)
+SQLITE_DOCUMENTS = {
+    'people': (1, ['gender', 'hair_color', 'eye_color']),
+    'planet': (2, ['climate', 'terrain']),
+    'vehicle': (3, ['model', 'manufacturer', 'vehicle_class'])
+}
+
+
+def create_sqlite_triggers(table, update_columns=None):
+    # Same triggers as 8c5e0f3a91d2, with the update one limited to update_columns
+    code, attributes = SQLITE_DOCUMENTS[table]
+    body = " || ' ' || ".join('new.' + attribute for attribute in attributes)
+    insert = (
+        "INSERT INTO search_index(rowid, name, body, type, ref_id) "
+        "VALUES (new.id * 4 + {code}, new.name, {body}, '{table}', new.id);"
+    ).format(code=code, body=body, table=table)
+    delete = "DELETE FROM search_index WHERE rowid = old.id * 4 + {code};".format(code=code)
+    update = 'UPDATE OF ' + ', '.join(update_columns) if update_columns else 'UPDATE'
+
+    for action in ('insert', 'update', 'delete'):
+        op.execute("DROP TRIGGER IF EXISTS {0}_search_{1}".format(table, action))
+    op.execute("CREATE TRIGGER {0}_search_insert AFTER INSERT ON {0} BEGIN {1} END".format(table, insert))
+    op.execute("CREATE TRIGGER {0}_search_update AFTER {1} ON {0} BEGIN {2} {3} END".format(table, update, delete, insert))
+    op.execute("CREATE TRIGGER {0}_search_delete AFTER DELETE ON {0} BEGIN {1} END".format(table, delete))
+
+
+def upgrade():
+    for table, column in TARGETS.items():
+        with op.batch_alter_table(table, schema=None, recreate='never') as batch_op:
+            batch_op.add_column(sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.create_index('ix_{}_favorite_count'.format(table), ['favorite_count', 'id'], unique=False)
+
+        # One GROUP BY over favorite, favorite.<column> has no index for a
+        # correlated count per row
+        counts = (
+            "SELECT {column} AS target_id, count(*) AS total FROM favorite "
+            "WHERE {column} IS NOT NULL AND user_id IS NOT NULL GROUP BY {column}"
+        ).format(column=column)
+        if op.get_bind().dialect.name == 'mysql':
+            op.execute(
+                "UPDATE {table} JOIN ({counts}) AS counts ON {table}.id = counts.target_id "
+                "SET {table}.favorite_count = counts.total".format(table=table, counts=counts)
+            )
+        else:
+            op.execute(
+                "UPDATE {table} SET favorite_count = counts.total FROM ({counts}) AS counts "
+                "WHERE {table}.id = counts.target_id".format(table=table, counts=counts)
+            )
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for table, (code, attributes) in SQLITE_DOCUMENTS.items():
+            create_sqlite_triggers(table, ['name'] + attributes)
+
+
+def downgrade():
+    for table in TARGETS:
+        with op.batch_alter_table(table, schema=None, recreate='never') as batch_op:
+            batch_op.drop_index('ix_{}_favorite_count'.format(table))
+            batch_op.drop_column('favorite_count')
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for table in SQLITE_DOCUMENTS:
+            create_sqlite_triggers(table)
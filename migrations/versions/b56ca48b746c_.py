@@ -0,0 +1,38 @@
+"""revoked_token for the JWT blocklist
+
+Revision ID: b56ca48b746c
+Revises: 1772a7cc4a7b
+Create Date: 2026-10-18 13:41:09.226871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b56ca48b746c'
+down_revision = '1772a7cc4a7b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('revoked_token',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('jti')
+    )
+    with op.batch_alter_table('revoked_token', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revoked_token_revoked_at'), ['revoked_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_revoked_token_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('revoked_token', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_token_expires_at'))
+        batch_op.drop_index(batch_op.f('ix_revoked_token_revoked_at'))
+
+    op.drop_table('revoked_token')
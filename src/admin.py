@@ -1,20 +1,168 @@
 import os
 from flask_admin import Admin
-from models import db, User, Planet, People, Vehicle, Favorite
 from flask_admin.contrib.sqla import ModelView
+from flask_admin.contrib.sqla.filters import FilterEqual, IntEqualFilter, IntGreaterFilter, IntSmallerFilter
+from sqlalchemy import Integer, String, and_, func, or_, text
+from sqlalchemy.orm import load_only
+from models import db, User, Planet, People, Vehicle, Favorite, bump_table_version, get_table_version
+from utils import indexed_columns
+from cache import LRUCache, cache
+
+# Seconds a list count is reused, and the most rows a filtered count reads
+ADMIN_COUNT_TTL = int(os.getenv('ADMIN_COUNT_TTL', 60))
+ADMIN_COUNT_LIMIT = int(os.getenv('ADMIN_COUNT_LIMIT', 10000))
+
+class IndexedModelView(ModelView):
+    """
+    ModelView for big tables, every list query can be served from an index:
+
+    - only the serialized columns are listed and loaded
+    - sort, filters and search are limited to indexed columns. Search matches
+      each term as a prefix (a range scan, not ILIKE '%term%') or an exact id
+    - pages in id order are read by keyset (id > last id of the previous
+      page) when the previous page was visited, OFFSET only on direct jumps
+    - counts are cached for ADMIN_COUNT_TTL: the planner's estimate for a
+      whole table (exact below ADMIN_COUNT_LIMIT), a count capped at
+      ADMIN_COUNT_LIMIT rows when filtered or searched
+    """
+    column_display_pk = True
+    column_default_sort = None
+    page_size = 50
+
+    def __init__(self, model, session, **kwargs):
+        indexed = indexed_columns(model)
+        columns = model.__table__.columns
+        # Read by Flask-Admin while it scaffolds the view in __init__
+        self.column_list = tuple(name for name in model.serialize_fields if name != 'id')
+        self.column_sortable_list = tuple(name for name in model.serialize_fields if name in indexed)
+        # Counters are kept by the application, not edited by hand
+        self.form_excluded_columns = tuple(column.name for column in columns if column.info.get('counter'))
+        self.column_searchable_list = tuple(name for name in self.column_sortable_list if isinstance(columns[name].type, String))
+        self.column_filters = []
+        for name in self.column_sortable_list:
+            column = getattr(model, name)
+            if isinstance(columns[name].type, Integer):
+                self.column_filters += [IntEqualFilter(column, name), IntGreaterFilter(column, name), IntSmallerFilter(column, name)]
+            else:
+                self.column_filters.append(FilterEqual(column, name))
+        self.counts = LRUCache(max_entries=256)
+        self.boundaries = LRUCache(max_entries=1024)
+        super().__init__(model, session, **kwargs)
+
+    def get_query(self):
+        names = [name for name, label in self._list_columns if name in self.model.__table__.columns]
+        return super().get_query().options(load_only(*[getattr(self.model, name) for name in names]))
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        for term in search.split(' '):
+            if not term:
+                continue
+            # 'abc' <= name < 'abc\uffff' is a prefix match on the b-tree
+            matches = [and_(column >= term, column < term + '\uffff') for column, path in self._search_fields]
+            if term.isdigit():
+                matches.append(self.model.id == int(term))
+            query = query.filter(or_(*matches))
+        return query, count_query, joins, count_joins
+
+    def estimated_count(self):
+        table = self.model.__table__.name
+        dialect = self.session.get_bind().dialect.name
+        estimate = None
+        if dialect == 'postgresql':
+            estimate = self.session.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}).scalar()
+        elif dialect == 'mysql':
+            estimate = self.session.execute(text("SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = :table"), {"table": table}).scalar()
+        # No statistics yet (-1 on PostgreSQL) or a small table: exact count
+        if estimate is None or estimate < ADMIN_COUNT_LIMIT:
+            return self.session.query(func.count(self.model.id)).scalar()
+        return int(estimate)
+
+    def get_count(self, query, key, narrowed):
+        count = self.counts.get(key)
+        if count is None:
+            if narrowed:
+                matching = query.with_entities(self.model.id).order_by(None).limit(ADMIN_COUNT_LIMIT).subquery()
+                count = self.session.query(func.count()).select_from(matching).scalar()
+            else:
+                count = self.estimated_count()
+            self.counts.set(key, count, ADMIN_COUNT_TTL)
+        return count
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        if page_size is None:
+            page_size = self.page_size
+        joins = {}
+        query = self.get_query()
+        if self._search_supported and search:
+            query, _, joins, _ = self._apply_search(query, None, joins, {}, search)
+        if filters and self._filters:
+            query, _, joins, _ = self._apply_filters(query, None, joins, {}, filters)
+
+        key = repr((search, filters))
+        count = self.get_count(query, key, bool(search or filters))
+
+        # Sorted by another indexed column, unpaged or an export: OFFSET
+        if sort_column is not None or not page_size or not execute:
+            query, joins = self._apply_sorting(query, joins, sort_column, sort_desc)
+            query = self._apply_pagination(query, page, page_size)
+            return count, query.all() if execute else query
+
+        after = self.boundaries.get(repr((key, page_size, page - 1))) if page else None
+        if after is not None:
+            query = query.filter(self.model.id > after).order_by(self.model.id).limit(page_size)
+        else:
+            query = query.order_by(self.model.id).limit(page_size).offset(page * page_size)
+        items = query.all()
+        if items:
+            self.boundaries.set(repr((key, page_size, page)), items[-1].id)
+        return count, items
+
+    # ----- Writes -----
+
+    def dependent_tables(self):
+        # Deleting a row here nulls their foreign keys (e.g. planet -> people)
+        return [table for table in db.metadata.sorted_tables
+                if any(foreign_key.column.table is self.model.__table__ for foreign_key in table.foreign_keys)]
+
+    def bump_versions(self, deleting=False):
+        # Same bookkeeping as the API writes (resources.py), in the admin's
+        # transaction, so the API's ETags change with the write
+        tables = [self.model.__table__] + (self.dependent_tables() if deleting else [])
+        for table in tables:
+            if get_table_version(table.name) is not None:
+                bump_table_version(table.name)
+
+    def forget(self, deleting=False):
+        self.counts.clear()
+        self.boundaries.clear()
+        tables = [self.model.__table__] + (self.dependent_tables() if deleting else [])
+        for table in tables:
+            cache.invalidate_all(table.name)
+
+    def on_model_change(self, form, model, is_created):
+        self.bump_versions()
+
+    def after_model_change(self, form, model, is_created):
+        self.forget()
+
+    def on_model_delete(self, model):
+        self.bump_versions(deleting=True)
+
+    def after_model_delete(self, model):
+        self.forget(deleting=True)
 
 def setup_admin(app):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
     admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
 
-    
+
     # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(User, db.session))
-    admin.add_view(ModelView(Planet, db.session))
-    admin.add_view(ModelView(People, db.session))
-    admin.add_view(ModelView(Vehicle, db.session))
-    admin.add_view(ModelView(Favorite, db.session))
+    admin.add_view(IndexedModelView(User, db.session))
+    admin.add_view(IndexedModelView(Planet, db.session))
+    admin.add_view(IndexedModelView(People, db.session))
+    admin.add_view(IndexedModelView(Vehicle, db.session))
+    admin.add_view(IndexedModelView(Favorite, db.session))
 
     # You can duplicate that line to add mew models
     # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
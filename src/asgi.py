@@ -0,0 +1,185 @@
+"""
+ASGI entry point, an alternative to wsgi.py for uvicorn:
+
+    $ pipenv run start-asgi
+    $ uvicorn asgi:application --app-dir src --workers 4
+
+The hot catalog reads run as async handlers on SQLAlchemy's asyncio engine
+(asyncpg for PostgreSQL, aiosqlite for SQLite), so a worker keeps serving
+while its queries wait on the database:
+
+    GET /people  /planets  /vehicles          ?after= &limit= &fields=
+    GET /people/<id>  /planets/<id>  /vehicles/<id>     ?fields=
+
+Same JSON, keyset cursor, X-Next-Cursor/Link headers and ETag/Last-Modified
+(304) as the Flask views. Every other request (writes, filters, ?sort=,
+streaming, auth, admin...) goes to the Flask app in a thread pool, so all
+the routes keep working. The async path skips the per-process response cache
+and the Flask request hooks (Server-Timing, /metrics).
+"""
+import os
+from urllib.parse import parse_qsl, urlencode
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.http import http_date, parse_date, parse_etags
+from app import app, resources
+from models import TableVersion
+from serializers import row_serializer
+from utils import APIException, DEFAULT_PAGE_SIZE, NDJSON_MIMETYPE, encode_cursor, parse_page_args, parse_fields
+from cache import etag_for
+from pool import engine_options
+
+ASYNC_ARGS = ('after', 'limit', 'fields')
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite"
+}
+
+def async_database_url(database_uri):
+    # None when the database has no asyncio driver here (MySQL), then every
+    # request goes to the Flask app
+    scheme, separator, rest = database_uri.partition("://")
+    if scheme not in ASYNC_DRIVERS:
+        return None
+    return ASYNC_DRIVERS[scheme] + separator + rest
+
+def async_engine_options(database_url):
+    # Same DB_POOL_* settings as the Flask app, the asyncio engine brings its
+    # own pool class (AsyncAdaptedQueuePool) instead of InstrumentedQueuePool
+    options = engine_options(database_url)
+    options.pop("poolclass", None)
+    return options
+
+class AsyncCatalog:
+    def __init__(self, app, resources, database_url, fallback):
+        self.app = app
+        self.fallback = fallback
+        self.engine = None
+        if database_url is not None:
+            self.engine = create_async_engine(database_url, **async_engine_options(database_url))
+        # path -> registered resource, only the cached catalog reads
+        self.resources = {}
+        for resource in resources.resources:
+            if resource.cached and 'list' in resource.methods and 'get' in resource.methods:
+                self.resources[resource.path] = resource
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        route = self.match(scope) if self.engine is not None else None
+        if route is None:
+            return await self.fallback(scope, receive, send)
+
+        resource, id, args = route
+        try:
+            status, body, headers = await self.handle(scope, resource, id, args)
+        except APIException as error:
+            status, body, headers = error.status_code, self.dumps(error.to_dict()), {}
+        await self.respond(send, status, body, headers)
+
+    def dumps(self, value):
+        # Same bytes as jsonify outside debug: compact, with a final newline
+        return self.app.json.dumps(value, separators=(",", ":")) + "\n"
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def match(self, scope):
+        # Requests the async handlers answer exactly like Flask, None otherwise
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return None
+        headers = dict(scope["headers"])
+        if NDJSON_MIMETYPE.encode() in headers.get(b"accept", b""):
+            return None
+        args = dict(parse_qsl(scope["query_string"].decode("latin-1")))
+        if any(arg not in ASYNC_ARGS for arg in args):
+            return None
+
+        path = scope["path"].rstrip("/") or "/"
+        if path in self.resources:
+            return self.resources[path], None, args
+        parent, _, id = path.rpartition("/")
+        if parent in self.resources and id.isdigit():
+            return self.resources[parent], int(id), args
+        return None
+
+    async def handle(self, scope, resource, id, args):
+        table = resource.model.__table__
+        headers = dict(scope["headers"])
+        full_path = scope["path"] + "?" + scope["query_string"].decode("latin-1")
+
+        async with self.engine.connect() as connection:
+            version = (await connection.execute(
+                select(TableVersion.version, TableVersion.updated_at).where(TableVersion.name == resource.name)
+            )).first()
+
+            response_headers = {}
+            if version is not None:
+                etag = etag_for(resource.name, version.version, full_path)
+                response_headers = {"ETag": '"' + etag + '"', "Last-Modified": http_date(version.updated_at)}
+                if self.not_modified(headers, etag, version.updated_at):
+                    return 304, "", response_headers
+
+            columns, serialize = row_serializer(resource.model, parse_fields(resource.model, args.get("fields")))
+            query = select(*[table.c[name] for name in columns])
+
+            if id is not None:
+                row = (await connection.execute(query.where(table.c.id == id))).first()
+                if row is None:
+                    return 400, self.dumps({"msg": resource.label.capitalize() + " no existe"}), {}
+                return 200, self.dumps(serialize(row)), response_headers
+
+            try:
+                limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+            except ValueError:
+                limit = DEFAULT_PAGE_SIZE
+            after, limit = parse_page_args(args.get("after"), limit)
+            if after is not None:
+                if not isinstance(after, int):
+                    raise APIException('Cursor invalido', status_code=400)
+                query = query.where(table.c.id > after)
+            rows = (await connection.execute(query.order_by(table.c.id).limit(limit + 1))).all()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            # id is always the first selected column, see row_serializer
+            next_cursor = encode_cursor(rows[-1][0])
+            args["after"] = next_cursor
+            response_headers["X-Next-Cursor"] = next_cursor
+            response_headers["Link"] = "<" + scope.get("root_path", "") + scope["path"] + "?" + urlencode(args) + '>; rel="next"'
+        return 200, self.dumps([serialize(row) for row in rows]), response_headers
+
+    def not_modified(self, headers, etag, last_modified):
+        if b"if-none-match" in headers:
+            return parse_etags(headers[b"if-none-match"].decode("latin-1")).contains(etag)
+        since = parse_date(headers.get(b"if-modified-since", b"").decode("latin-1") or None)
+        return since is not None and last_modified <= since.replace(tzinfo=None)
+
+    async def respond(self, send, status, body, headers):
+        body = body.encode() if isinstance(body, str) else body
+        raw_headers = [(b"content-length", str(len(body)).encode())]
+        if status != 304:
+            raw_headers.append((b"content-type", b"application/json"))
+        # Same CORS answer as flask_cors with its defaults
+        raw_headers.append((b"access-control-allow-origin", b"*"))
+        for name, value in headers.items():
+            raw_headers.append((name.lower().encode(), value.encode("latin-1")))
+        await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
+
+application = AsyncCatalog(
+    app,
+    resources,
+    async_database_url(app.config['SQLALCHEMY_DATABASE_URI']),
+    WSGIMiddleware(app, workers=int(os.getenv("ASGI_WSGI_THREADS", 10)))
+)
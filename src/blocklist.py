@@ -0,0 +1,109 @@
+"""
+Revoked JWTs for token_in_blocklist_loader: a bloom filter answers "never
+revoked" for almost every token without touching anything else, the exact
+set confirms the few positives and forgets tokens once they expire.
+
+Revocations are stored in the revoked_token table so every gunicorn worker
+sees them: each worker pulls the new rows at most every
+TOKEN_BLOCKLIST_SYNC_SECONDS, never per request.
+"""
+import os
+import math
+import heapq
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from models import db, RevokedToken
+
+SYNC_MARGIN = timedelta(seconds=60)
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key):
+        # Double hashing: k positions out of one 128 bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+class TokenBlocklist:
+    def __init__(self, capacity=1000000, error_rate=0.01, sync_seconds=5):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_seconds = sync_seconds
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.revoked = {}
+        self.expirations = []
+        self.evicted = 0
+        self.synced_until = None
+        self.last_sync = None
+        self.lock = threading.Lock()
+
+    def add(self, jti, expires_at):
+        with self.lock:
+            if jti in self.revoked:
+                return
+            self.bloom.add(jti)
+            self.revoked[jti] = expires_at
+            heapq.heappush(self.expirations, (expires_at, jti))
+
+    def evict_expired(self, now):
+        while self.expirations and self.expirations[0][0] <= now:
+            expires_at, jti = heapq.heappop(self.expirations)
+            self.revoked.pop(jti, None)
+            self.evicted += 1
+        # A bloom filter cannot forget, rebuild it once enough keys expired
+        if self.evicted > self.capacity // 2:
+            self.bloom = BloomFilter(self.capacity, self.error_rate)
+            for jti in self.revoked:
+                self.bloom.add(jti)
+            self.evicted = 0
+
+    def is_revoked(self, jti):
+        self.sync()
+        if jti not in self.bloom:
+            return False
+        with self.lock:
+            self.evict_expired(time.time())
+            return jti in self.revoked
+
+    def sync(self):
+        now = time.monotonic()
+        if self.last_sync is not None and now - self.last_sync < self.sync_seconds:
+            return
+        self.last_sync = now
+
+        # Rows are pulled by revoked_at with a margin instead of by id, ids from
+        # concurrent transactions can commit out of order; add() skips repeats
+        started = datetime.utcnow()
+        query = RevokedToken.query.filter(RevokedToken.expires_at > started)
+        if self.synced_until is not None:
+            query = query.filter(RevokedToken.revoked_at >= self.synced_until - SYNC_MARGIN)
+        for row in query:
+            self.add(row.jti, row.expires_at.replace(tzinfo=timezone.utc).timestamp())
+        self.synced_until = started
+
+    def revoke(self, jti, exp):
+        expires_at = datetime.utcfromtimestamp(exp)
+        # Expired revocations are useless, clean them up on the (rare) write path
+        RevokedToken.query.filter(RevokedToken.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+        db.session.add(RevokedToken(jti=jti, revoked_at=datetime.utcnow(), expires_at=expires_at))
+        db.session.commit()
+        self.add(jti, exp)
+
+blocklist = TokenBlocklist(
+    capacity=int(os.getenv('TOKEN_BLOCKLIST_CAPACITY', 1000000)),
+    sync_seconds=int(os.getenv('TOKEN_BLOCKLIST_SYNC_SECONDS', 5))
+)
@@ -0,0 +1,124 @@
+"""
+Batch create/update/delete for the catalog models: one uniqueness query,
+one executemany and one commit per request instead of per row
+"""
+import os
+from flask import request
+from utils import APIException, validate_fields
+from models import db
+
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 1000))
+
+def get_bulk_body():
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        raise APIException('Se esperaba una lista de elementos', status_code=400)
+    if len(items) > BULK_MAX_ITEMS:
+        raise APIException('Maximo ' + str(BULK_MAX_ITEMS) + ' elementos por pedido', status_code=400)
+    return items
+
+def bulk_create(model):
+    items = get_bulk_body()
+    results = [None] * len(items)
+    pending = []
+
+    for index, item in enumerate(items):
+        values, error = validate_fields(model, item)
+        if error is not None:
+            results[index] = {"index": index, "status": 400, "msg": error}
+        else:
+            pending.append((index, values))
+
+    # One SELECT ... WHERE name IN (...) for the whole batch
+    names = [values["name"] for index, values in pending]
+    existing = set()
+    if names:
+        existing = {row.name for row in db.session.query(model.name).filter(model.name.in_(names))}
+
+    mappings = []
+    seen = set()
+    for index, values in pending:
+        if values["name"] in existing or values["name"] in seen:
+            results[index] = {"index": index, "status": 400, "msg": "Ya existe en el sistema", "name": values["name"]}
+            continue
+        seen.add(values["name"])
+        mappings.append(values)
+        results[index] = {"index": index, "status": 200, "msg": "Creado con exito", "name": values["name"]}
+
+    if mappings:
+        db.session.bulk_insert_mappings(model, mappings)
+    return results, len(mappings)
+
+def bulk_update(model):
+    items = get_bulk_body()
+    results = [None] * len(items)
+    pending = []
+
+    for index, item in enumerate(items):
+        values, error = validate_fields(model, item)
+        if error is None and not isinstance(item.get("id"), int):
+            error = 'Falta el campo id'
+        if error is not None:
+            results[index] = {"index": index, "status": 400, "msg": error}
+        else:
+            values["id"] = item["id"]
+            pending.append((index, values))
+
+    ids = [values["id"] for index, values in pending]
+    existing = set()
+    if ids:
+        existing = {row.id for row in db.session.query(model.id).filter(model.id.in_(ids))}
+
+    # One SELECT ... WHERE name IN (...), a name is taken when another row has it
+    names = [values["name"] for index, values in pending]
+    taken = {}
+    if names:
+        for row in db.session.query(model.name, model.id).filter(model.name.in_(names)):
+            taken.setdefault(row.name, set()).add(row.id)
+
+    mappings = []
+    seen = set()
+    for index, values in pending:
+        if values["id"] not in existing:
+            results[index] = {"index": index, "status": 400, "msg": "No existe en el sistema", "id": values["id"]}
+            continue
+        if taken.get(values["name"], set()) - {values["id"]} or values["name"] in seen:
+            results[index] = {"index": index, "status": 400, "msg": "Ya existe en el sistema", "id": values["id"], "name": values["name"]}
+            continue
+        seen.add(values["name"])
+        mappings.append(values)
+        results[index] = {"index": index, "status": 200, "msg": "Modificado con exito", "id": values["id"]}
+
+    if mappings:
+        db.session.bulk_update_mappings(model, mappings)
+    return results, len(mappings)
+
+def bulk_delete(model):
+    ids = get_bulk_body()
+    valid_ids = [id for id in ids if isinstance(id, int) and not isinstance(id, bool)]
+    existing = set()
+    if valid_ids:
+        existing = {row.id for row in db.session.query(model.id).filter(model.id.in_(valid_ids))}
+
+    results = []
+    for index, id in enumerate(ids):
+        if isinstance(id, int) and id in existing:
+            results.append({"index": index, "status": 200, "msg": "Eliminado con exito", "id": id})
+        else:
+            results.append({"index": index, "status": 400, "msg": "No existe en el sistema", "id": id})
+
+    if existing:
+        existing = list(existing)
+        clear_references(model, existing)
+        model.query.filter(model.id.in_(existing)).delete(synchronize_session=False)
+    return results, len(existing)
+
+def clear_references(model, ids):
+    # A Core DELETE skips the ORM relationships, so null the foreign keys that
+    # point to the deleted rows the same way session.delete() does
+    for table in db.metadata.sorted_tables:
+        for foreign_key in table.foreign_keys:
+            if foreign_key.column.table is model.__table__:
+                db.session.execute(
+                    table.update().where(foreign_key.parent.in_(ids)).values({foreign_key.parent.name: None})
+                )
@@ -0,0 +1,269 @@
+"""
+Read-through cache for the serialized responses of the catalog endpoints
+"""
+import os
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import wraps
+from flask import g, request, make_response, Response
+from utils import stream_format
+from models import get_table_version
+
+class CacheBackend(ABC):
+    """
+    Storage used by ResponseCache. The default is the in-process LRUCache,
+    any subclass with these methods (e.g. a local redis/memcached stand-in)
+    can be plugged with `cache.backend = MyBackend()`.
+    """
+    evictions = 0
+
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+class LRUCache(CacheBackend):
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+class ResponseCache:
+    """
+    Keys are versioned instead of scanned on invalidation:
+
+        <resource>:gen                          -> resource generation
+        <resource>:<gen>:list-gen               -> generation of every list page
+        <resource>:<gen>:item-gen:<id>          -> generation of one item
+        <resource>:<gen>:<version>:list:<list-gen>:<query>
+        <resource>:<gen>:<version>:item:<id>:<item-gen>:<query>
+
+    Writing an item only bumps its own generation and the list generation, the
+    old entries become unreachable and age out of the LRU. The keys are
+    resolved before the view runs, so a response computed while a write
+    happens is stored under the old generation and never served.
+
+    The generations live in one process. <version> is the table_version that
+    conditional() read for the request, so a write made by another worker
+    (or the CLI, or an admin in its own process) also stops every entry of
+    this one from matching.
+    """
+
+    def __init__(self, backend=None, ttl=60):
+        self.backend = backend if backend is not None else LRUCache()
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def generation(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            value = os.urandom(4).hex()
+            self.backend.set(key, value)
+        return value
+
+    def bump(self, key):
+        self.backend.set(key, os.urandom(4).hex())
+
+    def resource_prefix(self, resource):
+        return resource + ":" + self.generation(resource + ":gen")
+
+    def key_for(self, resource, id=None, version=None):
+        prefix = self.resource_prefix(resource)
+        versioned = prefix + ":" + str(version or 0)
+        if id is not None:
+            item_generation = self.generation(prefix + ":item-gen:" + str(id))
+            # The query string carries ?fields=, every field set is its own entry
+            return versioned + ":item:" + str(id) + ":" + item_generation + ":" + request.query_string.decode()
+        list_generation = self.generation(prefix + ":list-gen")
+        return versioned + ":list:" + list_generation + ":" + request.query_string.decode()
+
+    def invalidate(self, resource, id=None):
+        # A write to one item: drop that item and every list page
+        prefix = self.resource_prefix(resource)
+        if id is not None:
+            self.bump(prefix + ":item-gen:" + str(id))
+        self.bump(prefix + ":list-gen")
+        self.count("invalidations")
+
+    def invalidate_all(self, resource):
+        # Writes that can change any row of the resource (e.g. a planet
+        # deletion clears people.planet_id)
+        self.bump(resource + ":gen")
+        self.count("invalidations")
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self.backend)
+        }
+
+    def cached(self, resource):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or stream_format() is not None:
+                    return view(*args, **kwargs)
+
+                key = self.key_for(resource, kwargs.get("id"), g.get("table_version"))
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.count("hits")
+                    body, status, headers = entry
+                    return Response(body, status=status, headers=headers)
+
+                self.count("misses")
+                response = make_response(view(*args, **kwargs))
+                # Only successful, fully built responses are cached
+                if response.status_code == 200 and not response.is_streamed:
+                    self.backend.set(key, (response.get_data(), response.status_code, list(response.headers.items())), self.ttl)
+                return response
+            return wrapper
+        return decorator
+
+def etag_for(table, version, full_path):
+    # The same version serves different bodies per path and query string
+    return hashlib.sha1((table + ":" + str(version) + ":" + full_path).encode()).hexdigest()
+
+def conditional(table):
+    """
+    Strong ETag and Last-Modified for GET endpoints, derived from the table
+    version bumped by every write. A poll with a matching If-None-Match (or a
+    fresh If-Modified-Since) costs one primary key lookup and returns an empty
+    304, the view is never called. Otherwise the version is left in
+    g.table_version for the response cache key (see ResponseCache).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if stream_format() is not None:
+                return view(*args, **kwargs)
+
+            version = get_table_version(table)
+            if version is None:
+                return view(*args, **kwargs)
+
+            etag = etag_for(table, version.version, request.full_path)
+            last_modified = version.updated_at
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since.replace(tzinfo=None)
+
+            if not_modified:
+                response = Response(status=304)
+            else:
+                g.table_version = version.version
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
+
+cache = ResponseCache(
+    LRUCache(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", 1024))),
+    ttl=int(os.getenv("CACHE_TTL", 60))
+)
+
+class IdentityCache:
+    """
+    Serialized users for JWT protected routes, keyed by user id and token
+    iat. Each user has a generation key, invalidate() bumps it and every
+    cached token of that user stops matching at once.
+    """
+
+    def __init__(self, backend=None, ttl=30):
+        self.backend = backend if backend is not None else LRUCache()
+        self.ttl = ttl
+
+    def key_for(self, user_id, iat):
+        generation_key = "identity:" + str(user_id) + ":gen"
+        generation = self.backend.get(generation_key)
+        if generation is None:
+            generation = os.urandom(4).hex()
+            self.backend.set(generation_key, generation)
+        return "identity:" + str(user_id) + ":" + generation + ":" + str(iat)
+
+    def get(self, user_id, iat):
+        if self.ttl <= 0:
+            return None
+        return self.backend.get(self.key_for(user_id, iat))
+
+    def set(self, user_id, iat, user):
+        if self.ttl > 0:
+            self.backend.set(self.key_for(user_id, iat), user, self.ttl)
+
+    def invalidate(self, user_id):
+        self.backend.set("identity:" + str(user_id) + ":gen", os.urandom(4).hex())
+
+identity_cache = IdentityCache(
+    LRUCache(max_entries=int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", 10000))),
+    ttl=int(os.getenv("IDENTITY_CACHE_TTL", 30))
+)
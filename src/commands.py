@@ -0,0 +1,478 @@
+"""
+Flask CLI commands, registered in app.py with setup_commands(app)
+
+    $ pipenv run load data/planets.json --model planet
+    $ pipenv run load data/people.ndjson --model people --batch-size 10000
+    $ flask bench-favorites --rows 200000
+    $ flask bench-serialize --rows 100000
+    $ flask bench-bulk --rows 2000
+    $ pipenv run bench-http http://localhost:3000/people --connections 500
+    $ pipenv run reconcile-favorites
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+import tracemalloc
+import click
+from flask import current_app, url_for
+from sqlalchemy import Column, Index, MetaData, Table, UniqueConstraint, bindparam, create_engine, func, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from urllib.parse import urlsplit
+from models import db, People, Planet, Vehicle, Favorite, FAVORITE_TARGETS, bump_table_version
+from serializers import row_serializer
+
+MODELS = {"people": People, "planet": Planet, "vehicle": Vehicle}
+READ_CHUNK_SIZE = 1 << 16
+COPY_NULL = "\\N"
+
+def iter_json_array(file):
+    # Incremental parse of a top-level JSON array, only one chunk and the
+    # current record are held in memory
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_CHUNK_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise click.ClickException("Se esperaba un arreglo JSON o NDJSON")
+    buffer = buffer[1:]
+    number = 1
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise click.ClickException("Registro {}: JSON invalido o archivo incompleto".format(number))
+            buffer += chunk
+            continue
+        yield record
+        number += 1
+        buffer = buffer[end:]
+
+def iter_ndjson(file):
+    for number, line in enumerate(file, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            raise click.ClickException("Linea {}: no es JSON valido ({})".format(number, error))
+
+def iter_records(file):
+    first = ""
+    while not first.strip():
+        first = file.read(1)
+        if not first:
+            return iter(())
+    file.seek(0)
+    if first == "[":
+        return iter_json_array(file)
+    return iter_ndjson(file)
+
+def to_int(value):
+    # SWAPI dumps use strings such as "1,000", "unknown" or "n/a"
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(float(str(value).replace(",", "")))
+    except ValueError:
+        return 0
+
+def build_row(model, record, planet_ids):
+    # Django fixture style dumps wrap the columns in "fields"
+    record = record.get("fields", record)
+    row = {}
+    for column in model.__table__.columns:
+        if column.primary_key or column.info.get("counter"):
+            continue
+        if column.name == "planet_id":
+            value = record.get("planet_id")
+            if not isinstance(value, int):
+                value = planet_ids.get(record.get("planet") or record.get("homeworld"))
+            row["planet_id"] = value
+            continue
+        if column.name not in record:
+            if not column.nullable:
+                return None
+            row[column.name] = None
+        elif isinstance(column.type, db.Integer):
+            row[column.name] = to_int(record[column.name])
+        else:
+            row[column.name] = str(record[column.name])
+    return row
+
+def copy_batch(model, rows):
+    # COPY ... FROM STDIN through the session's own connection, so it shares
+    # the batch transaction
+    columns = list(rows[0].keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([COPY_NULL if row[name] is None else row[name] for name in columns])
+    buffer.seek(0)
+
+    sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '{}')".format(
+        model.__table__.name, ", ".join(columns), COPY_NULL)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+def insert_batch(model, rows, use_copy, first):
+    # One SELECT ... WHERE name IN (...) per batch, like bulk_create: names
+    # already in the table or earlier in the batch are skipped. The table
+    # version is bumped in the batch's transaction, so every committed batch
+    # changes the ETags. Returns the number of rows inserted
+    names = {row["name"] for row in rows}
+    seen = {name for name, in db.session.query(model.name).filter(model.name.in_(names))}
+    new_rows = []
+    for row in rows:
+        if row["name"] not in seen:
+            seen.add(row["name"])
+            new_rows.append(row)
+    if not new_rows:
+        return 0
+
+    # COPY raises the driver's own exception, not SQLAlchemy's
+    integrity_errors = (IntegrityError, db.engine.dialect.dbapi.IntegrityError)
+    try:
+        if use_copy:
+            copy_batch(model, new_rows)
+        else:
+            db.session.execute(model.__table__.insert(), new_rows)
+        bump_table_version(model.__table__.name)
+        db.session.commit()
+    except integrity_errors as error:
+        db.session.rollback()
+        raise click.ClickException("Lote desde el registro {}: {}".format(first, getattr(error, "orig", error)))
+    return len(new_rows)
+
+async def read_response(reader):
+    # Minimal HTTP/1.1 client: status, headers, Content-Length or chunked body
+    version, status = (await reader.readline()).split()[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get("content-length", 0)))
+    keep_alive = version == b"HTTP/1.1" and headers.get("connection") != "close"
+    return int(status), keep_alive
+
+async def http_client(host, port, request, deadline, latencies, errors):
+    connection = None
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            # Sync gunicorn workers close after every response, reconnect then
+            if connection is None:
+                connection = await asyncio.open_connection(host, port)
+            reader, writer = connection
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            errors.append(None)
+            connection = None
+            await asyncio.sleep(0.01)
+            continue
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(status)
+        if not keep_alive:
+            writer.close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+async def run_load(url, connections, duration):
+    parts = urlsplit(url)
+    path = parts.path + ("?" + parts.query if parts.query else "")
+    request = ("GET " + (path or "/") + " HTTP/1.1\r\nHost: " + parts.netloc + "\r\nAccept: application/json\r\n\r\n").encode()
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[
+        http_client(parts.hostname, parts.port or 80, request, deadline, latencies, errors)
+        for _ in range(connections)
+    ])
+    return latencies, errors
+
+def favorite_table(indexed):
+    # Copy of the favorite table without foreign keys, with or without the
+    # indexes and unique constraints of the model
+    metadata = MetaData()
+    source = Favorite.__table__
+    table = Table(source.name, metadata, *[Column(column.name, column.type, primary_key=column.primary_key) for column in source.columns])
+    if indexed:
+        for constraint in source.constraints:
+            if isinstance(constraint, UniqueConstraint):
+                table.append_constraint(UniqueConstraint(*[column.name for column in constraint.columns], name=constraint.name))
+        for index in source.indexes:
+            Index(index.name, *[table.c[column.name] for column in index.columns], unique=index.unique)
+    return metadata, table
+
+def setup_commands(app):
+
+    @app.cli.command("load-catalog")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--model", "model_name", type=click.Choice(sorted(MODELS)), required=True)
+    @click.option("--batch-size", default=5000, show_default=True, help="Filas por transaccion")
+    def load_catalog(path, model_name, batch_size):
+        """Carga un volcado JSON o NDJSON estilo SWAPI en people, planet o vehicle."""
+        model = MODELS[model_name]
+        use_copy = db.engine.dialect.name == "postgresql"
+
+        # Mapa nombre -> id de los planetas para resolver People.planet_id
+        planet_ids = {}
+        if model is People:
+            planet_ids = {name: id for id, name in db.session.query(Planet.id, Planet.name)}
+
+        loaded = 0
+        skipped = 0
+        existing = 0
+        batch = []
+        first = 1
+        started = time.perf_counter()
+        with open(path, encoding="utf-8") as file:
+            for number, record in enumerate(iter_records(file), 1):
+                row = build_row(model, record, planet_ids) if isinstance(record, dict) else None
+                if row is None:
+                    skipped += 1
+                    continue
+                if not batch:
+                    first = number
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    inserted = insert_batch(model, batch, use_copy, first)
+                    loaded += inserted
+                    existing += len(batch) - inserted
+                    batch = []
+                    elapsed = time.perf_counter() - started
+                    click.echo("{} filas, {:.0f} filas/s".format(loaded, loaded / elapsed))
+            if batch:
+                inserted = insert_batch(model, batch, use_copy, first)
+                loaded += inserted
+                existing += len(batch) - inserted
+
+        elapsed = time.perf_counter() - started
+        click.echo("Cargadas {} filas en {:.1f}s ({:.0f} filas/s), {} omitidas, {} ya existian".format(
+            loaded, elapsed, loaded / elapsed if elapsed else 0, skipped, existing))
+
+    @app.cli.command("reconcile-favorites")
+    @click.option("--batch-size", default=5000, show_default=True, help="Filas del catalogo por transaccion")
+    def reconcile_favorites(batch_size):
+        """Recalcula favorite_count de planet, people y vehicle desde la tabla favorite."""
+        for column, model in FAVORITE_TARGETS.items():
+            # One GROUP BY pass over favorite per target, then the catalog is
+            # walked by id and only the rows that drifted are written. A
+            # favorite written during the run can leave its row off by one
+            # until the next run, schedule it at low traffic
+            target = Favorite.__table__.c[column]
+            counts = dict(db.session.query(target, func.count()).filter(
+                target.isnot(None), Favorite.user_id.isnot(None)).group_by(target))
+            table = model.__table__
+            fixed = 0
+            last_id = 0
+            while True:
+                rows = db.session.query(table.c.id, table.c.favorite_count).filter(
+                    table.c.id > last_id).order_by(table.c.id).limit(batch_size).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                drifted = [{"target_id": id, "count": counts.get(id, 0)}
+                           for id, favorite_count in rows if favorite_count != counts.get(id, 0)]
+                if drifted:
+                    db.session.execute(
+                        table.update().where(table.c.id == bindparam("target_id")).values(favorite_count=bindparam("count")),
+                        drifted)
+                    fixed += len(drifted)
+                db.session.commit()
+            click.echo("{}: {} filas corregidas".format(table.name, fixed))
+
+    @app.cli.command("bench-favorites")
+    @click.option("--rows", default=200000, show_default=True)
+    @click.option("--duration", default=2.0, show_default=True, help="Segundos de consultas por caso")
+    def bench_favorites(rows, duration):
+        """Plan y consultas/s de las busquedas de favoritos, sin y con los indices de Favorite."""
+        # Base en memoria propia, no toca la base de la aplicacion
+        per_user = 20
+        users = max(rows // per_user, 1)
+        # nombre -> (consulta, parametros de la consulta numero n)
+        queries = {
+            "favorito de un usuario": (
+                lambda table: select(table.c.id).where(table.c.user_id == bindparam("user_id"), table.c.planet_id == bindparam("planet_id")),
+                lambda number: {"user_id": number % users + 1, "planet_id": number % per_user + 1}
+            ),
+            "favoritos de un usuario": (
+                lambda table: select(table.c.id).where(table.c.user_id == bindparam("user_id")),
+                lambda number: {"user_id": number % users + 1}
+            )
+        }
+        for indexed in (False, True):
+            metadata, table = favorite_table(indexed)
+            engine = create_engine("sqlite://")
+            metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(table.insert(), [
+                    {"user_id": index // per_user + 1, "planet_id": index % per_user + 1} for index in range(rows)
+                ])
+            click.echo("con indices" if indexed else "sin indices")
+            with engine.connect() as connection:
+                for name, (query, params) in queries.items():
+                    statement = query(table)
+                    plan = connection.execute(text("EXPLAIN QUERY PLAN " + str(statement)), params(0))
+                    lookups = 0
+                    started = time.perf_counter()
+                    while time.perf_counter() - started < duration:
+                        connection.execute(statement, params(lookups)).all()
+                        lookups += 1
+                    elapsed = time.perf_counter() - started
+                    click.echo("  {:24s} {:10.0f} consultas/s  {}".format(name, lookups / elapsed, " / ".join(row[-1] for row in plan)))
+
+    @app.cli.command("bench-serialize")
+    @click.option("--rows", default=100000, show_default=True)
+    def bench_serialize(rows):
+        """Compara /people con instancias ORM + serialize() contra filas de columnas."""
+        # Base en memoria propia, no toca la base de la aplicacion
+        engine = create_engine("sqlite://")
+        db.metadata.create_all(engine, tables=[Planet.__table__, People.__table__])
+        with engine.begin() as connection:
+            connection.execute(People.__table__.insert(), [{
+                "name": "people %d" % index, "height": 172, "mass": 77, "hair_color": "blond",
+                "skin_color": "fair", "eye_color": "blue", "birth_year": "19BBY",
+                "gender": "male", "planet_id": None
+            } for index in range(rows)])
+
+        dumps = current_app.json.dumps
+        columns, serialize = row_serializer(People)
+        selected = [People.__table__.c[name] for name in columns]
+
+        def orm_path(session):
+            items = session.query(People).order_by(People.id).all()
+            return dumps([item.serialize() for item in items])
+
+        def column_path(session):
+            result = session.query(*selected).order_by(People.id).all()
+            return dumps([serialize(row) for row in result])
+
+        for name, path in (("orm + serialize()", orm_path), ("columnas + serializador", column_path)):
+            with Session(engine) as session:
+                started = time.perf_counter()
+                path(session)
+                elapsed = time.perf_counter() - started
+            # Segunda corrida solo para medir memoria, tracemalloc distorsiona el tiempo
+            with Session(engine) as session:
+                tracemalloc.start()
+                path(session)
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            click.echo("{:24s} {:10.0f} filas/s  pico {:7.1f} MB".format(name, rows / elapsed, peak / 2 ** 20))
+
+    @app.cli.command("bench-bulk")
+    @click.option("--rows", default=2000, show_default=True)
+    @click.option("--batch-size", default=1000, show_default=True, help="Elementos por pedido a /people/bulk")
+    def bench_bulk(rows, batch_size):
+        """Compara POST/PUT /people fila por fila contra /people/bulk.
+
+        Usa los endpoints reales sobre la base configurada (DATABASE_URL), las
+        filas creadas se borran al final con DELETE /people/bulk.
+        """
+        client = current_app.test_client()
+        with current_app.test_request_context():
+            paths = {endpoint: url_for("people_" + endpoint) for endpoint in ("post", "bulk")}
+        prefix = "bench {} ".format(os.urandom(4).hex())
+
+        def people(name):
+            return {
+                "name": name, "height": 172, "mass": 77, "hair_color": "blond", "skin_color": "fair",
+                "eye_color": "blue", "birth_year": "19BBY", "gender": "male", "planet_id": None
+            }
+
+        def check(response):
+            if response.status_code != 200:
+                raise click.ClickException("{} {}".format(response.status_code, response.get_data(as_text=True)))
+
+        def batches(items):
+            for start in range(0, len(items), batch_size):
+                yield items[start:start + batch_size]
+
+        def single_post(items):
+            for item in items:
+                check(client.post(paths["post"], json=item))
+
+        def single_put(items):
+            for item in items:
+                check(client.put(paths["post"] + "/" + str(item["id"]), json=item))
+
+        def bulk_post(items):
+            for batch in batches(items):
+                check(client.post(paths["bulk"], json=batch))
+
+        def bulk_put(items):
+            for batch in batches(items):
+                check(client.put(paths["bulk"], json=batch))
+
+        try:
+            for name, create, update in (("fila por fila", single_post, single_put), ("bulk", bulk_post, bulk_put)):
+                items = [people(prefix + name + " " + str(index)) for index in range(rows)]
+                started = time.perf_counter()
+                create(items)
+                created = time.perf_counter() - started
+
+                names = [item["name"] for item in items]
+                found = dict(db.session.query(People.name, People.id).filter(People.name.in_(names)))
+                db.session.rollback()
+                for item in items:
+                    item["id"] = found[item["name"]]
+                    item["height"] += 1
+
+                started = time.perf_counter()
+                update(items)
+                updated = time.perf_counter() - started
+                click.echo("{:14s} POST {:8.0f} filas/s   PUT {:8.0f} filas/s".format(name, rows / created, rows / updated))
+        finally:
+            ids = [row.id for row in db.session.query(People.id).filter(People.name.startswith(prefix))]
+            db.session.rollback()
+            for batch in batches(ids):
+                client.delete(paths["bulk"], json=batch)
+
+    @app.cli.command("bench-http")
+    @click.argument("url")
+    @click.option("--connections", default=500, show_default=True, help="Conexiones concurrentes")
+    @click.option("--duration", default=30, show_default=True, help="Segundos de carga")
+    def bench_http(url, connections, duration):
+        """Carga GET sobre un servidor en marcha: peticiones/s y latencias p50/p99.
+
+        Para comparar los dos modos, con la misma base y el mismo numero de procesos:
+
+            gunicorn -c gunicorn.conf.py wsgi --chdir ./src/ -w 4 -b :3000
+            uvicorn asgi:application --app-dir src --workers 4 --port 3001
+        """
+        latencies, errors = asyncio.run(run_load(url, connections, duration))
+        if not latencies:
+            raise click.ClickException("Ninguna respuesta 200, {} errores".format(len(errors)))
+        latencies.sort()
+
+        def percentile(value):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * value))] * 1000
+
+        click.echo("{} conexiones, {}s: {:.0f} peticiones/s, p50 {:.1f} ms, p99 {:.1f} ms, {} errores".format(
+            connections, duration, len(latencies) / duration, percentile(0.50), percentile(0.99), len(errors)))
@@ -0,0 +1,61 @@
+"""
+Per-request SQL statistics collected from SQLAlchemy engine events: statement
+count, total DB time and slowest statement, sent back as Server-Timing and
+written to a structured slow-query log
+"""
+import os
+import json
+import time
+import logging
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+STATEMENT_LOG_LENGTH = 1000
+
+slow_query_logger = logging.getLogger('sql.slow')
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if has_request_context():
+        g.sql_count = g.get('sql_count', 0) + 1
+        g.sql_time_ms = g.get('sql_time_ms', 0.0) + elapsed_ms
+        if elapsed_ms > g.get('sql_slowest_ms', 0.0):
+            g.sql_slowest_ms = elapsed_ms
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        # Parameters are left out on purpose, they can carry passwords
+        slow_query_logger.warning(json.dumps({
+            "event": "slow_query",
+            "duration_ms": round(elapsed_ms, 2),
+            "statement": statement[:STATEMENT_LOG_LENGTH],
+            "executemany": executemany,
+            "endpoint": request.endpoint if has_request_context() else None,
+            "method": request.method if has_request_context() else None,
+            "path": request.path if has_request_context() else None
+        }))
+
+@event.listens_for(Engine, "handle_error")
+def handle_error(exception_context):
+    # after_cursor_execute does not run for failed statements
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_started'):
+        conn.info['query_started'].pop()
+
+def server_timing(response):
+    count = g.get('sql_count', 0)
+    if count:
+        response.headers.add('Server-Timing', 'db;dur={:.2f};desc="{} queries"'.format(g.sql_time_ms, count))
+        response.headers.add('Server-Timing', 'db-slowest;dur={:.2f}'.format(g.sql_slowest_ms))
+    return response
+
+def setup_instrumentation(app):
+    app.after_request(server_timing)
@@ -0,0 +1,63 @@
+"""
+Prometheus metrics per Flask endpoint, exposed at /metrics
+
+With several gunicorn workers set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by all of them (wiped on every deploy): each worker writes
+its samples to mmap'ed files there and /metrics aggregates the whole
+directory, whichever worker answers.
+"""
+import os
+import time
+from flask import g, request, Response
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, multiprocess
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests by endpoint, method and status',
+    ['endpoint', 'method', 'status']
+)
+LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint',
+    ['endpoint', 'method'], buckets=LATENCY_BUCKETS
+)
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'HTTP requests being served by endpoint',
+    ['endpoint'], multiprocess_mode='livesum'
+)
+
+def endpoint_label():
+    # 404s have no endpoint, keep them in one series
+    return request.endpoint or 'unmatched'
+
+def start_request():
+    g.metrics_started = time.perf_counter()
+    IN_FLIGHT.labels(endpoint_label()).inc()
+
+def record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+def finish_request(error=None):
+    if 'metrics_started' not in g:
+        return
+    endpoint = endpoint_label()
+    IN_FLIGHT.labels(endpoint).dec()
+    LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - g.metrics_started)
+    # Unhandled exceptions never reach after_request
+    REQUESTS.labels(endpoint, request.method, str(g.get('metrics_status', 500))).inc()
+
+def metrics_response():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+def setup_metrics(app):
+    app.before_request(start_request)
+    app.after_request(record_status)
+    app.teardown_request(finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_response, methods=['GET'])
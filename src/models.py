@@ -1,8 +1,49 @@
+import sqlite3
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import declared_attr
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from passwords import hash_password, verify_password, needs_rehash
 
 db = SQLAlchemy()
 
-class User(db.Model):
+# SQLite only checks foreign keys when asked to, the favorite upsert relies on them
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+class SerializeMixin:
+    """
+    serialize() returns the columns named in serialize_fields, in that order.
+    serializers.py builds the row serializers of the read endpoints from the
+    same tuple, so both always send the same keys. Columns left out (e.g.
+    User.password) are never serialized.
+    """
+    serialize_fields = ()
+
+    def serialize(self):
+        return {name: getattr(self, name) for name in self.serialize_fields}
+
+class FavoriteCountMixin:
+    """
+    favorite_count: favorites with a user, kept by the favorite writes (see
+    adjust_favorite_count). info counter: never sent by clients,
+    validate_fields skips it. The leaderboard (/<path>/top) reads the
+    (favorite_count, id) index backwards.
+    """
+    favorite_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', info={'counter': True})
+
+    @declared_attr
+    def __table_args__(cls):
+        return (db.Index('ix_' + cls.__tablename__ + '_favorite_count', 'favorite_count', 'id'),)
+
+class User(SerializeMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(250), nullable=False)
     last_name = db.Column(db.String(250), nullable=False)
@@ -15,26 +56,28 @@ class User(db.Model):
     def __repr__(self):
         return '<User %r>' % self.id
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "first_name": self.first_name,
-            "last_name": self.last_name,
-            "email": self.email,
-            "username": self.username
-            # do not serialize the password, its a security breach
-        }
-
-class Planet(db.Model):
+    def set_password(self, password):
+        self.password = hash_password(password)
+
+    def check_password(self, password):
+        return verify_password(password, self.password)
+
+    def password_needs_rehash(self):
+        return needs_rehash(self.password)
+
+    # do not serialize the password, its a security breach
+    serialize_fields = ("id", "first_name", "last_name", "email", "username")
+
+class Planet(SerializeMixin, FavoriteCountMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(250), unique=True, nullable=False)
     diameter = db.Column(db.Integer, nullable=False)
     rotation_period = db.Column(db.Integer, nullable=False)
     orbital_period = db.Column(db.Integer, nullable=False)
     gravity = db.Column(db.String(250), nullable=False)
-    population = db.Column(db.Integer, nullable=False)
-    climate = db.Column(db.String(250), nullable=False)
-    terrain = db.Column(db.String(250), nullable=False)
+    population = db.Column(db.Integer, nullable=False, index=True)
+    climate = db.Column(db.String(250), nullable=False, index=True)
+    terrain = db.Column(db.String(250), nullable=False, index=True)
     surface_water = db.Column(db.Integer, nullable=False)
     favorite = db.relationship('Favorite', backref='planet', lazy=True)
     people = db.relationship('People', backref='planet', lazy=True)
@@ -43,22 +86,9 @@ class Planet(db.Model):
     def __repr__(self):
         return '<Planet %r>' % self.id
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "diameter": self.diameter,
-            "rotation_period": self.rotation_period,
-            "orbital_period": self.orbital_period,
-            "gravity": self.gravity,
-            "population": self.population,
-            "climate": self.climate,
-            "terrain": self.terrain,
-            "surface_water": self.surface_water
-            # do not serialize the password, its a security breach
-        }
-
-class People(db.Model):
+    serialize_fields = ("id", "name", "diameter", "rotation_period", "orbital_period", "gravity", "population", "climate", "terrain", "surface_water")
+
+class People(SerializeMixin, FavoriteCountMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(250), unique=True, nullable=False)
     height = db.Column(db.Integer, nullable=False)
@@ -67,34 +97,21 @@ class People(db.Model):
     skin_color = db.Column(db.String(250), nullable=False)
     eye_color = db.Column(db.String(250), nullable=False)
     birth_year = db.Column(db.String(250), nullable=False)
-    gender = db.Column(db.String(250), nullable=False)
-    planet_id = db.Column(db.Integer, db.ForeignKey("planet.id"))
+    gender = db.Column(db.String(250), nullable=False, index=True)
+    planet_id = db.Column(db.Integer, db.ForeignKey("planet.id"), index=True)
     favorite = db.relationship('Favorite', backref='people', lazy=True)
 
 
     def __repr__(self):
         return '<People %r>' % self.id
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "height": self.height,
-            "mass": self.mass,
-            "hair_color": self.hair_color,
-            "skin_color": self.skin_color,
-            "eye_color": self.eye_color,
-            "birth_year": self.birth_year,
-            "gender": self.gender,
-            "planet_id": self.planet_id
-            # do not serialize the password, its a security breach
-        }
-
-class Vehicle(db.Model):
+    serialize_fields = ("id", "name", "height", "mass", "hair_color", "skin_color", "eye_color", "birth_year", "gender", "planet_id")
+
+class Vehicle(SerializeMixin, FavoriteCountMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(250), nullable=False)
+    name = db.Column(db.String(250), nullable=False, index=True)
     model = db.Column(db.String(250), nullable=False)
-    vehicle_class = db.Column(db.String(250), nullable=False)
+    vehicle_class = db.Column(db.String(250), nullable=False, index=True)
     manufacturer = db.Column(db.String(250), nullable=False)
     cost_in_credits = db.Column(db.Integer, nullable=False)
     length = db.Column(db.Integer, nullable=False)
@@ -109,25 +126,19 @@ class Vehicle(db.Model):
     def __repr__(self):
         return '<Vehicle %r>' % self.id
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "vehicle_class": self.vehicle_class,
-            "manufacturer": self.manufacturer,
-            "cost_in_credits": self.cost_in_credits,
-            "length": self.length,
-            "crew": self.crew,
-            "passengers": self.passengers,
-            "max_atmospheric_speed": self.max_atmospheric_speed,
-            "cargo_capacity": self.cargo_capacity,
-            "consumables": self.consumables
-            # do not serialize the password, its a security breach
-        }
-
-class Favorite(db.Model):
+    serialize_fields = ("id", "name", "vehicle_class", "manufacturer", "cost_in_credits", "length", "crew", "passengers", "max_atmospheric_speed", "cargo_capacity", "consumables")
+
+class Favorite(SerializeMixin, db.Model):
+    # A user can favorite each planet, people or vehicle only once, the unique
+    # constraints double as the (user_id, target_id) lookup indexes
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'planet_id', name='uq_favorite_user_planet'),
+        db.UniqueConstraint('user_id', 'people_id', name='uq_favorite_user_people'),
+        db.UniqueConstraint('user_id', 'vehicle_id', name='uq_favorite_user_vehicle'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), index=True)
     people_id = db.Column(db.Integer, db.ForeignKey("people.id"))
     planet_id = db.Column(db.Integer, db.ForeignKey("planet.id"))
     vehicle_id = db.Column(db.Integer, db.ForeignKey("vehicle.id"))
@@ -135,14 +146,146 @@ class Favorite(db.Model):
     def __repr__(self):
         return '<Favorite %r>' % self.id
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "user_id": self.user_id,
-            "people_id": self.people_id,
-            "planet_id": self.planet_id,
-            "vehicle_id": self.vehicle_id
-            # do not serialize the password, its a security breach
-        }
-
-    
\ No newline at end of file
+    serialize_fields = ("id", "user_id", "people_id", "planet_id", "vehicle_id")
+
+    def serialize_expanded(self):
+        # Needs planet, people and vehicle loaded up front (see joinedload in
+        # getUserFavorite), otherwise every favorite lazy loads its target
+        favorite = self.serialize()
+        favorite["planet"] = self.planet.serialize() if self.planet is not None else None
+        favorite["people"] = self.people.serialize() if self.people is not None else None
+        favorite["vehicle"] = self.vehicle.serialize() if self.vehicle is not None else None
+        return favorite
+
+# Results of insert_favorite
+FAVORITE_CREATED = "created"
+FAVORITE_DUPLICATE = "duplicate"
+FAVORITE_USER_MISSING = "user_missing"
+FAVORITE_TARGET_MISSING = "target_missing"
+
+MYSQL_DUPLICATE_ENTRY = 1062
+
+def insert_favorite(user_id, column, target_id):
+    # One INSERT statement: the unique constraints catch duplicates and the
+    # foreign keys catch a missing user or target, no lookups beforehand.
+    # A NULL target passes both, so the id is checked here
+    if not isinstance(target_id, int) or isinstance(target_id, bool):
+        return FAVORITE_TARGET_MISSING
+
+    values = {"user_id": user_id, column: target_id}
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        statement = postgresql.insert(Favorite.__table__).values(**values).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        statement = sqlite.insert(Favorite.__table__).values(**values).on_conflict_do_nothing()
+    else:
+        # MySQL's INSERT IGNORE would also swallow foreign key errors, so a
+        # plain INSERT is used and the duplicate is told apart by error code
+        statement = Favorite.__table__.insert().values(**values)
+
+    try:
+        result = db.session.execute(statement)
+        if result.rowcount == 1:
+            adjust_favorite_count(db.session, column, target_id, 1)
+        db.session.commit()
+    except IntegrityError as error:
+        db.session.rollback()
+        code = getattr(error.orig, "errno", None) or (error.orig.args[0] if error.orig.args else None)
+        if dialect == "mysql" and code == MYSQL_DUPLICATE_ENTRY:
+            return FAVORITE_DUPLICATE
+        # Foreign key violation, only this error path pays for a lookup
+        if User.query.filter_by(id=user_id).first() is None:
+            return FAVORITE_USER_MISSING
+        return FAVORITE_TARGET_MISSING
+
+    if result.rowcount == 0:
+        return FAVORITE_DUPLICATE
+    return FAVORITE_CREATED
+
+# ----- favorite_count -----
+# Planet, People and Vehicle count their favorites that have a user. The count
+# moves in the same transaction as the favorite: insert_favorite (a Core
+# INSERT) updates it itself, ORM writes (the deleteFavorite* handlers,
+# /favorite/<id>, admin) through the mapper events below. Anything else
+# (raw SQL, a crash between versions) is fixed by `flask reconcile-favorites`
+
+FAVORITE_TARGETS = {"planet_id": Planet, "people_id": People, "vehicle_id": Vehicle}
+
+def adjust_favorite_count(connection, column, target_id, delta):
+    # connection: a Connection or the Session, both execute Core statements
+    table = FAVORITE_TARGETS[column].__table__
+    connection.execute(
+        table.update().where(table.c.id == target_id).values(favorite_count=table.c.favorite_count + delta)
+    )
+
+def favorite_targets(values):
+    # (column, id) pairs a favorite counts for
+    if values["user_id"] is None:
+        return set()
+    return {(column, values[column]) for column in FAVORITE_TARGETS if values[column] is not None}
+
+def favorite_values(favorite, previous=False):
+    # Current column values, or the ones loaded before this flush changed them
+    state = inspect(favorite)
+    values = {}
+    for name in ("user_id",) + tuple(FAVORITE_TARGETS):
+        history = state.attrs[name].history
+        values[name] = history.deleted[0] if previous and history.deleted else getattr(favorite, name)
+    return values
+
+@event.listens_for(Favorite, "after_insert")
+def count_inserted_favorite(mapper, connection, favorite):
+    for column, target_id in favorite_targets(favorite_values(favorite)):
+        adjust_favorite_count(connection, column, target_id, 1)
+
+@event.listens_for(Favorite, "after_update")
+def count_updated_favorite(mapper, connection, favorite):
+    # e.g. deleting a user or planet nulls the foreign key of its favorites
+    before = favorite_targets(favorite_values(favorite, previous=True))
+    after = favorite_targets(favorite_values(favorite))
+    for column, target_id in before - after:
+        adjust_favorite_count(connection, column, target_id, -1)
+    for column, target_id in after - before:
+        adjust_favorite_count(connection, column, target_id, 1)
+
+@event.listens_for(Favorite, "after_delete")
+def count_deleted_favorite(mapper, connection, favorite):
+    for column, target_id in favorite_targets(favorite_values(favorite, previous=True)):
+        adjust_favorite_count(connection, column, target_id, -1)
+
+class RevokedToken(db.Model):
+    # Revoked JWTs, read in bulk by blocklist.TokenBlocklist, never per request
+    __tablename__ = 'revoked_token'
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    revoked_at = db.Column(db.DateTime, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return '<RevokedToken %r>' % self.jti
+
+class TableVersion(db.Model):
+    # One row per catalog table, bumped by every write so GET endpoints can
+    # answer conditional requests without loading or serializing the rows
+    __tablename__ = 'table_version'
+    name = db.Column(db.String(80), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<TableVersion %r>' % self.name
+
+def bump_table_version(name):
+    # Runs in the caller's transaction, so the new version is committed
+    # together with the write it describes
+    now = datetime.utcnow().replace(microsecond=0)
+    updated = TableVersion.query.filter_by(name=name).update({
+        "version": TableVersion.version + 1,
+        "updated_at": now
+    }, synchronize_session=False)
+    if updated == 0:
+        db.session.add(TableVersion(name=name, version=1, updated_at=now))
+
+def get_table_version(name):
+    return TableVersion.query.filter_by(name=name).first()
@@ -0,0 +1,90 @@
+"""
+Password hashing with scrypt (hashlib, no extra dependency). The KDF runs in a
+bounded thread pool: hashlib releases the GIL while it works, so with
+threaded workers other requests keep being served, and the pool caps how
+many hashes (and their memory) run at the same time.
+
+Stored format: scrypt$<log2 N>$<r>$<p>$<salt b64>$<hash b64>
+
+    $ python src/passwords.py   (logins/sec per core for each cost)
+"""
+import os
+import hmac
+import base64
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Cost: N = 2 ** PASSWORD_COST, raising it makes every login rehash the
+# stored password with the new cost
+PASSWORD_COST = int(os.getenv('PASSWORD_COST', 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 64
+PREFIX = 'scrypt'
+
+hash_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)),
+    thread_name_prefix='password-hash'
+)
+
+def b64encode(value):
+    return base64.b64encode(value).decode()
+
+def scrypt(password, salt, cost, r, p):
+    n = 2 ** cost
+    # OpenSSL refuses anything above 32MB unless maxmem is raised
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=HASH_BYTES, maxmem=256 * r * n)
+
+def run_in_pool(function, *args):
+    return hash_pool.submit(function, *args).result()
+
+def _hash_password(password, cost):
+    salt = os.urandom(SALT_BYTES)
+    digest = scrypt(password, salt, cost, SCRYPT_R, SCRYPT_P)
+    return '$'.join([PREFIX, str(cost), str(SCRYPT_R), str(SCRYPT_P), b64encode(salt), b64encode(digest)])
+
+def _verify_password(password, stored):
+    if not stored.startswith(PREFIX + '$'):
+        # Passwords saved before hashing existed, rehashed on the next login
+        return hmac.compare_digest(password.encode(), stored.encode())
+    # A malformed stored value (wrong field count, bad base64 or parameters
+    # scrypt refuses) fails the check instead of raising
+    try:
+        prefix, cost, r, p, salt, digest = stored.split('$')
+        candidate = scrypt(password, base64.b64decode(salt), int(cost), int(r), int(p))
+        return hmac.compare_digest(candidate, base64.b64decode(digest))
+    except ValueError:
+        return False
+
+def hash_password(password, cost=None):
+    if not isinstance(password, str):
+        raise TypeError('password must be a string')
+    return run_in_pool(_hash_password, password, PASSWORD_COST if cost is None else cost)
+
+def verify_password(password, stored):
+    # Anything but a string (a number or a list from the JSON body) never matches
+    if not isinstance(password, str) or not isinstance(stored, str):
+        return False
+    return run_in_pool(_verify_password, password, stored)
+
+def needs_rehash(stored):
+    parts = stored.split('$')
+    if len(parts) != 6 or parts[0] != PREFIX:
+        return True
+    try:
+        return (int(parts[1]), int(parts[2]), int(parts[3])) != (PASSWORD_COST, SCRYPT_R, SCRYPT_P)
+    except ValueError:
+        return True
+
+if __name__ == '__main__':
+    for cost in range(10, 17):
+        stored = _hash_password('benchmark', cost)
+        rounds = max(3, 2 ** (16 - cost))
+        started = time.perf_counter()
+        for _ in range(rounds):
+            _verify_password('benchmark', stored)
+        elapsed = time.perf_counter() - started
+        print('cost {:2d} (N=2^{}, {:4d} MB): {:8.1f} logins/sec per core'.format(
+            cost, cost, 128 * SCRYPT_R * 2 ** cost // 2 ** 20, rounds / elapsed))
@@ -0,0 +1,98 @@
+"""
+Database configuration, connection pool settings (SQLALCHEMY_ENGINE_OPTIONS
+from env vars) and per-worker pool metrics
+"""
+import os
+import threading
+import time
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds in seconds of the checkout wait histogram
+CHECKOUT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+
+def env_bool(name, default):
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+class CheckoutHistogram:
+    def __init__(self, buckets=CHECKOUT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.sum += seconds
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[index] += 1
+                    break
+
+    def serialize(self):
+        # Cumulative counts, le="+Inf" equals count
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {
+            "buckets": buckets,
+            "count": self.count,
+            "sum": self.sum
+        }
+
+checkout_latency = CheckoutHistogram()
+
+class InstrumentedQueuePool(QueuePool):
+    # _do_get is where a checkout waits for a free connection (or opens an
+    # overflow one), timing it gives the real pool wait per request
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            checkout_latency.observe(time.perf_counter() - started)
+
+def configure_database(app):
+    # Shared by the API app and the admin app of startup.py
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+def engine_options(database_uri):
+    options = {
+        "pool_pre_ping": env_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800))
+    }
+    # SQLite uses its own pool classes that take no size settings
+    if not database_uri.startswith("sqlite"):
+        options.update({
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+            "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 30))
+        })
+    return options
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {
+        "pid": os.getpid(),
+        "pool": pool.__class__.__name__,
+        "checkout_latency": checkout_latency.serialize()
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            # QueuePool counts overflow from -pool_size, negative means no overflow in use
+            "overflow": max(pool.overflow(), 0)
+        })
+    return stats
@@ -0,0 +1,246 @@
+"""
+Declarative CRUD resources. Routes, validation, serialization, pagination,
+caching, conditional GET and bulk endpoints are derived from the model's
+column metadata, so a new model only needs one register() line in app.py:
+
+    resources.register(People, '/people', 'personaje')
+
+Registered routes (endpoint names in brackets):
+
+    GET    /people            list, paginated or streamed   [people_list]
+    GET    /people/<id>       one item                      [people_get]
+                              both accept ?fields=name,height
+                              the list also takes filters and ?sort= on
+                              indexed columns: ?gender=male&height__gt=180
+    POST   /people            create                        [people_post]
+    PUT    /people/<id>       full update                   [people_put]
+    DELETE /people/<id>       delete                        [people_delete]
+    POST|PUT|DELETE /people/bulk   batch create/update/delete  [people_bulk]
+    GET    /people/top        most favorited first          [people_top]
+                              when registered with top='favorite_count'
+"""
+from flask import request, jsonify
+from sqlalchemy.exc import IntegrityError
+from models import db, bump_table_version
+from utils import list_response, validate_fields, get_fields, get_filters, get_sort, APIException
+from cache import cache, conditional
+from bulk import bulk_create, bulk_update, bulk_delete
+from serializers import column_query
+
+ALL_METHODS = ('list', 'get', 'post', 'put', 'delete')
+TOP_DEFAULT_LIMIT = 10
+TOP_MAX_LIMIT = 100
+
+class Resource:
+    def __init__(self, registry, model, path, label, methods=ALL_METHODS, cached=True, bulk=True, unique=None, before_save=None, after_write=None, top=None):
+        self.registry = registry
+        self.model = model
+        self.path = path
+        self.label = label
+        self.name = model.__table__.name
+        self.methods = methods
+        # cached: response cache, ETag/Last-Modified and table_version bumps
+        self.cached = cached
+        self.bulk = bulk
+        # Columns checked for duplicates before an insert, by default the
+        # ones declared unique in the model
+        if unique is None:
+            unique = tuple(column.name for column in model.__table__.columns if column.unique)
+        self.unique = unique
+        self.before_save = before_save
+        self.after_write = after_write
+        # Counter column of the /top ranking, it needs an index led by it
+        self.top = top
+
+    # ----- Messages, same wording as the original handlers -----
+
+    def message(self, status_code, msg):
+        return jsonify({"msg": msg}), status_code
+
+    def not_found(self):
+        return self.message(400, self.label.capitalize() + " no existe")
+
+    # ----- Cache and version bookkeeping -----
+
+    def dependents(self):
+        # Registered resources with a foreign key to this table, deleting a row
+        # here nulls their column (e.g. planet -> people.planet_id)
+        for resource in self.registry.resources:
+            for foreign_key in resource.model.__table__.foreign_keys:
+                if foreign_key.column.table is self.model.__table__ and resource.cached:
+                    yield resource
+                    break
+
+    def bump_versions(self, deleting=False):
+        if self.cached:
+            bump_table_version(self.name)
+        if deleting:
+            for resource in self.dependents():
+                bump_table_version(resource.name)
+
+    def invalidate(self, id=None, deleting=False, everything=False):
+        if self.cached:
+            if everything:
+                cache.invalidate_all(self.name)
+            else:
+                cache.invalidate(self.name, id)
+        if deleting:
+            for resource in self.dependents():
+                cache.invalidate_all(resource.name)
+        if self.after_write is not None:
+            self.after_write(id)
+
+    def commit(self, deleting=False):
+        # The flush runs inside the try: the table_version UPDATE would
+        # otherwise autoflush the pending write, and raise its constraint
+        # errors, before the commit
+        try:
+            db.session.flush()
+            self.bump_versions(deleting=deleting)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        return True
+
+    # ----- Views -----
+
+    def list_view(self):
+        sort = get_sort(self.model)
+        query, serialize = column_query(self.model, get_fields(self.model), (sort[0].name,) if sort else ())
+        query = query.filter(*get_filters(self.model))
+        return list_response(query, self.model, serialize, sort), 200
+
+    def get_view(self, id):
+        query, serialize = column_query(self.model, get_fields(self.model))
+        row = query.filter(self.model.id == id).first()
+        if row is None:
+            return self.not_found()
+        return jsonify(serialize(row)), 200
+
+    def post_view(self):
+        values, error = validate_fields(self.model, request.get_json(silent=True))
+        if error is not None:
+            return self.message(400, error)
+
+        for column in self.unique:
+            if self.model.query.filter_by(**{column: values[column]}).first() is not None:
+                return self.message(400, "El " + self.label + " ya existe en el sistema")
+
+        item = self.model(**values)
+        if self.before_save is not None:
+            self.before_save(item, values)
+        db.session.add(item)
+        if not self.commit():
+            return self.message(400, "El " + self.label + " viola una restriccion de la base de datos")
+        self.invalidate()
+
+        return self.message(200, "El " + self.label + " fue creado con exito")
+
+    def put_view(self, id):
+        values, error = validate_fields(self.model, request.get_json(silent=True))
+        if error is not None:
+            return self.message(400, error)
+
+        item = self.model.query.filter_by(id=id).first()
+        if item is None:
+            return self.message(400, "El " + self.label + " no existe en el sistema")
+
+        for column, value in values.items():
+            setattr(item, column, value)
+        if self.before_save is not None:
+            self.before_save(item, values)
+        if not self.commit():
+            return self.message(400, "El " + self.label + " viola una restriccion de la base de datos")
+        self.invalidate(id)
+
+        return self.message(200, "El " + self.label + " fue modificado con exito")
+
+    def delete_view(self, id):
+        item = self.model.query.filter_by(id=id).first()
+        if item is None:
+            return self.not_found()
+
+        db.session.delete(item)
+        self.bump_versions(deleting=True)
+        db.session.commit()
+        self.invalidate(id, deleting=True)
+
+        return self.message(200, "Eliminación correcta de " + self.label.capitalize())
+
+    def top_view(self):
+        # Not cached: the counter moves with every favorite, and the index
+        # makes it a LIMIT n read whatever the table size
+        limit = request.args.get('limit', TOP_DEFAULT_LIMIT, type=int)
+        if limit is None or limit < 1:
+            raise APIException('El parametro limit debe ser un entero positivo', status_code=400)
+        fields = self.model.serialize_fields + (self.top,)
+        query, serialize = column_query(self.model, fields)
+        column = self.model.__table__.c[self.top]
+        rows = query.order_by(column.desc(), self.model.id.desc()).limit(min(limit, TOP_MAX_LIMIT))
+        return jsonify([serialize(row) for row in rows]), 200
+
+    def bulk_view(self):
+        # POST crea, PUT modifica (cada elemento lleva su id) y DELETE elimina
+        # una lista de ids, todo en una sola transaccion
+        actions = {'POST': bulk_create, 'PUT': bulk_update, 'DELETE': bulk_delete}
+        deleting = request.method == 'DELETE'
+        violation = "El lote viola una restriccion de la base de datos, no se aplico ningun cambio"
+        # The bulk_*_mappings statements run right away, not at commit
+        try:
+            results, changed = actions[request.method](self.model)
+        except IntegrityError:
+            db.session.rollback()
+            return self.message(400, violation)
+
+        if changed > 0:
+            if not self.commit(deleting=deleting):
+                return self.message(400, violation)
+            self.invalidate(deleting=deleting, everything=True)
+
+        response_body = {
+            "changed": changed,
+            "results": results
+        }
+        return jsonify(response_body), 200
+
+    # ----- Routing -----
+
+    def wrap_read(self, view):
+        if self.cached:
+            return conditional(self.name)(cache.cached(self.name)(view))
+        return view
+
+    def add_routes(self, app):
+        item_path = self.path + '/<int:id>'
+        routes = {
+            'list': (self.path, 'GET', self.wrap_read(self.list_view)),
+            'get': (item_path, 'GET', self.wrap_read(self.get_view)),
+            'post': (self.path, 'POST', self.post_view),
+            'put': (item_path, 'PUT', self.put_view),
+            'delete': (item_path, 'DELETE', self.delete_view)
+        }
+        for method in self.methods:
+            rule, http_method, view = routes[method]
+            app.add_url_rule(rule, self.name + '_' + method, view, methods=[http_method])
+        if self.bulk:
+            app.add_url_rule(self.path + '/bulk', self.name + '_bulk', self.bulk_view, methods=['POST', 'PUT', 'DELETE'])
+        if self.top is not None:
+            app.add_url_rule(self.path + '/top', self.name + '_top', self.top_view, methods=['GET'])
+
+class ResourceRegistry:
+    def __init__(self, app=None):
+        self.app = app
+        self.resources = []
+
+    def register(self, model, path, label, **options):
+        resource = Resource(self, model, path, label, **options)
+        self.resources.append(resource)
+        resource.add_routes(self.app)
+        return resource
+
+    def get(self, model):
+        for resource in self.resources:
+            if resource.model is model:
+                return resource
+        return None
@@ -0,0 +1,97 @@
+"""
+Type-ahead search over people, planet and vehicle, one ranked mixed list.
+Every term is a prefix: "luk sky" finds "Luke Skywalker".
+
+- PostgreSQL: to_tsvector('simple', ...) @@ 'luk:* & sky:*' on the GIN
+  expression indexes of migration 8c5e0f3a91d2, ranked with ts_rank
+- SQLite: the FTS5 table search_index, kept in sync by triggers, ranked
+  with bm25 (name weighs 10x the other attributes). A database built with
+  db.create_all() instead of the migrations has no search_index, it falls
+  back to the LIKE search
+- Anything else (MySQL): name LIKE 'luk%' on the indexed name columns
+
+The document expressions must stay equal to the ones in the migration,
+otherwise PostgreSQL cannot use the indexes.
+"""
+import os
+import re
+import logging
+from flask import request
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from utils import APIException
+from models import db
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', 100))
+SEARCH_MAX_TERMS = 5
+SEARCH_MIN_LENGTH = 2
+
+logger = logging.getLogger(__name__)
+
+# type -> (table, document expression)
+SEARCH_DOCUMENTS = {
+    "people": ("people", "name || ' ' || gender || ' ' || hair_color || ' ' || eye_color"),
+    "planet": ("planet", "name || ' ' || climate || ' ' || terrain"),
+    "vehicle": ("vehicle", "name || ' ' || model || ' ' || manufacturer || ' ' || vehicle_class")
+}
+
+def get_search_args():
+    terms = re.findall(r'\w+', request.args.get('q', '').lower())[:SEARCH_MAX_TERMS]
+    if not terms or len(''.join(terms)) < SEARCH_MIN_LENGTH:
+        raise APIException('La busqueda necesita al menos ' + str(SEARCH_MIN_LENGTH) + ' caracteres', status_code=400)
+    limit = request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int)
+    if limit is None or limit < 1:
+        raise APIException('El parametro limit debe ser un entero positivo', status_code=400)
+    return terms, min(limit, SEARCH_MAX_LIMIT)
+
+def search_postgresql(terms, limit):
+    branches = []
+    for type, (table, document) in SEARCH_DOCUMENTS.items():
+        branches.append(
+            "SELECT '{type}' AS type, id, name, ts_rank(to_tsvector('simple', {document}), query) AS score "
+            "FROM {table}, to_tsquery('simple', :query) AS query "
+            "WHERE to_tsvector('simple', {document}) @@ query".format(type=type, table=table, document=document)
+        )
+    sql = "SELECT type, id, name, score FROM (" + " UNION ALL ".join(branches) + ") AS results ORDER BY score DESC, name LIMIT :limit"
+    query = " & ".join(term + ":*" for term in terms)
+    return db.session.execute(text(sql), {"query": query, "limit": limit})
+
+def search_sqlite(terms, limit):
+    sql = (
+        "SELECT type, ref_id AS id, name, -bm25(search_index, 10.0, 1.0) AS score "
+        "FROM search_index WHERE search_index MATCH :query ORDER BY score DESC, name LIMIT :limit"
+    )
+    # Quoted prefix tokens, FTS5 syntax characters in the input stay literal
+    query = " ".join('"' + term + '"*' for term in terms)
+    try:
+        return db.session.execute(text(sql), {"query": query, "limit": limit})
+    except OperationalError:
+        db.session.rollback()
+        # Only looked up when the query fails, not on every search
+        table = db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")).first()
+        if table is not None:
+            raise
+        logger.warning("search_index does not exist (run flask db upgrade), searching names with LIKE")
+        return search_like(terms, limit)
+
+def search_like(terms, limit):
+    # The whole input as a name prefix, uses the b-tree indexes on name
+    branches = [
+        "SELECT '{type}' AS type, id, name, 1.0 AS score FROM {table} WHERE name LIKE :prefix".format(type=type, table=table)
+        for type, (table, document) in SEARCH_DOCUMENTS.items()
+    ]
+    sql = "SELECT type, id, name, score FROM (" + " UNION ALL ".join(branches) + ") AS results ORDER BY name LIMIT :limit"
+    prefix = ' '.join(terms).replace('%', '').replace('_', '') + '%'
+    return db.session.execute(text(sql), {"prefix": prefix, "limit": limit})
+
+def search_catalog():
+    terms, limit = get_search_args()
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        rows = search_postgresql(terms, limit)
+    elif dialect == "sqlite":
+        rows = search_sqlite(terms, limit)
+    else:
+        rows = search_like(terms, limit)
+    return [{"type": row.type, "id": row.id, "name": row.name, "score": round(float(row.score), 4)} for row in rows]
@@ -0,0 +1,53 @@
+"""
+Column based serialization for read endpoints: only the serialized columns
+are selected and come back as plain rows (no ORM instances, identity map or
+change tracking), then a function generated once per (model, fields) builds
+the dict:
+
+    lambda row: {'id': row[0], 'name': row[1], ...}
+
+Optionally orjson replaces Flask's JSON provider when it is installed.
+"""
+import os
+from functools import lru_cache
+from flask.json.provider import DefaultJSONProvider
+from models import db
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bounded: ?fields= combinations are chosen by the client
+@lru_cache(maxsize=256)
+def row_serializer(model, fields=None, extra=()):
+    fields = model.serialize_fields if fields is None else fields
+    # id is always selected first and `extra` (e.g. the sort column) after it,
+    # keyset pagination reads them from the row for the cursor
+    columns = ("id",)
+    for name in extra + tuple(fields):
+        if name not in columns:
+            columns += (name,)
+    body = ", ".join("%r: row[%d]" % (name, columns.index(name)) for name in fields)
+    serialize = eval(compile("lambda row: {" + body + "}", "<serializer %s>" % model.__name__, "eval"), {})
+    return columns, serialize
+
+def column_query(model, fields=None, extra=()):
+    columns, serialize = row_serializer(model, fields, tuple(extra))
+    query = db.session.query(*[model.__table__.c[name] for name in columns])
+    return query, serialize
+
+class ORJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+def setup_json(app):
+    # JSON_BACKEND=json keeps the standard library even with orjson installed
+    if orjson is not None and os.getenv("JSON_BACKEND", "orjson") == "orjson":
+        app.json = ORJSONProvider(app)
@@ -0,0 +1,98 @@
+"""
+What app.py mounts at import besides the API. Production traffic never
+touches /admin, so by default Flask-Admin is not imported until it is used.
+ADMIN_MODE:
+
+- lazy (default): /admin is built on its first request, as a small Flask app
+  of its own on the same database, and served from there on
+- eager: Flask-Admin is set up at import, like before
+- off: no /admin in this process, run it as a separate one:
+
+      gunicorn "startup:create_admin_app()" --chdir ./src/
+
+Flask-Migrate (and alembic) is only set up under the flask CLI, which is
+what `flask db upgrade` uses, or in eager mode.
+
+Import time of app.py per mode, with python -X importtime:
+
+    $ pipenv run bench-import
+"""
+import os
+import sys
+import subprocess
+import threading
+from collections import defaultdict
+from flask import Flask
+
+ADMIN_MODE = os.getenv("ADMIN_MODE", "lazy")
+ADMIN_PREFIX = "/admin"
+
+def create_admin_app():
+    from admin import setup_admin
+    from models import db
+    from pool import configure_database
+    admin_app = Flask(__name__)
+    configure_database(admin_app)
+    db.init_app(admin_app)
+    setup_admin(admin_app)
+    return admin_app
+
+class LazyAdmin:
+    # WSGI middleware: requests under /admin go to the admin app, created on
+    # the first one, everything else to the API
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.admin_app = None
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path != ADMIN_PREFIX and not path.startswith(ADMIN_PREFIX + "/"):
+            return self.wsgi_app(environ, start_response)
+        if self.admin_app is None:
+            with self.lock:
+                if self.admin_app is None:
+                    self.admin_app = create_admin_app()
+        return self.admin_app(environ, start_response)
+
+def setup_startup(app):
+    if ADMIN_MODE == "eager":
+        from admin import setup_admin
+        setup_admin(app)
+    elif ADMIN_MODE == "lazy":
+        app.wsgi_app = LazyAdmin(app.wsgi_app)
+
+    # The flask command sets FLASK_RUN_FROM_CLI before it loads the app
+    if ADMIN_MODE == "eager" or os.getenv("FLASK_RUN_FROM_CLI") == "true":
+        from flask_migrate import Migrate
+        from models import db
+        Migrate(app, db)
+
+def import_time(mode):
+    # Microseconds: cumulative for `import app` and self time per top-level package
+    env = dict(os.environ, ADMIN_MODE=mode)
+    env.pop("FLASK_RUN_FROM_CLI", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(result.stderr)
+    total = 0
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(own)
+        if name.strip() == "app":
+            total = int(cumulative)
+    return total, packages
+
+if __name__ == '__main__':
+    # Best of 5 runs per mode and the 10 slowest packages
+    for mode in ("eager", "lazy", "off"):
+        total, packages = min((import_time(mode) for _ in range(5)), key=lambda run: run[0])
+        print("ADMIN_MODE={:6s} import app: {:7.1f} ms".format(mode, total / 1000))
+        for name, own in sorted(packages.items(), key=lambda item: -item[1])[:10]:
+            print("    {:28s} {:7.1f} ms".format(name, own / 1000))
@@ -1,4 +1,25 @@
-from flask import jsonify, url_for
+import os
+import json
+import base64
+from sqlalchemy import Integer, String, UniqueConstraint, PrimaryKeyConstraint, and_, or_
+from flask import jsonify, url_for, request, current_app, Response, stream_with_context
+
+# Keyset pagination: page size when the client does not send ?limit= and the
+# hard cap the server enforces no matter what the client asks for
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 1000))
+# Query string parameters that are not column filters
+RESERVED_ARGS = ('after', 'limit', 'stream', 'fields', 'sort', 'expand')
+FILTER_OPERATORS = {
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value,
+    'in': lambda column, value: column.in_(value)
+}
+# Streaming export: rows fetched from the database per round trip
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 1000))
+NDJSON_MIMETYPE = 'application/x-ndjson'
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +36,231 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def encode_cursor(value):
+    # An id, or [sort value, id] when the list is sorted by another column
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    # Accept the opaque cursor returned in `next` and, for convenience, a raw
+    # id. isdigit() alone also accepts digits int() does not parse, like '²'
+    if cursor.isascii() and cursor.isdigit():
+        return int(cursor)
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except ValueError:
+        raise APIException('Cursor invalido', status_code=400)
+
+def parse_page_args(after, limit):
+    # Shared with asgi.py, which reads the query string without Flask
+    if after is not None:
+        after = decode_cursor(after)
+
+    if limit is None or limit < 1:
+        raise APIException('El parametro limit debe ser un entero positivo', status_code=400)
+
+    return after, min(limit, MAX_PAGE_SIZE)
+
+def get_page_args():
+    return parse_page_args(request.args.get('after'), request.args.get('limit', DEFAULT_PAGE_SIZE, type=int))
+
+def parse_fields(model, fields):
+    # ?fields=name,diameter -> only those columns are selected and serialized.
+    # Normalized to the model's field order so equal sets share a serializer
+    if not fields:
+        return None
+    requested = set(field.strip() for field in fields.split(',') if field.strip())
+    unknown = requested - set(model.serialize_fields)
+    if unknown:
+        raise APIException('Campos desconocidos: ' + ', '.join(sorted(unknown)), status_code=400)
+    return tuple(field for field in model.serialize_fields if field in requested)
+
+def get_fields(model):
+    return parse_fields(model, request.args.get('fields'))
+
+def indexed_columns(model):
+    # Columns that lead an index (primary key, unique, index=True or a
+    # composite index), the only ones allowed in filters and sort
+    table = model.__table__
+    names = {column.name for column in table.columns if column.primary_key or column.index or column.unique}
+    for index in table.indexes:
+        names.add(index.columns[0].name)
+    for constraint in table.constraints:
+        # Foreign keys are left out, PostgreSQL does not index them
+        if isinstance(constraint, (UniqueConstraint, PrimaryKeyConstraint)) and len(constraint.columns):
+            names.add(list(constraint.columns)[0].name)
+    return names & set(model.serialize_fields)
+
+def parse_value(column, value):
+    if isinstance(column.type, Integer):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise APIException('El filtro ' + column.name + ' debe ser un entero', status_code=400)
+    return value
+
+def get_filters(model):
+    # ?climate=arid&population__gt=1000000&gender__in=male,female
+    allowed = indexed_columns(model)
+    filters = []
+    for arg, value in request.args.items(multi=True):
+        if arg in RESERVED_ARGS:
+            continue
+        name, _, operator = arg.partition('__')
+        if name not in allowed:
+            raise APIException('Filtro no permitido (solo columnas indexadas): ' + name, status_code=400)
+        if operator and operator not in FILTER_OPERATORS:
+            raise APIException('Operador desconocido: ' + operator, status_code=400)
+        column = model.__table__.c[name]
+        if operator == 'in':
+            filters.append(FILTER_OPERATORS['in'](column, [parse_value(column, item) for item in value.split(',')]))
+        elif operator:
+            filters.append(FILTER_OPERATORS[operator](column, parse_value(column, value)))
+        else:
+            filters.append(column == parse_value(column, value))
+    return filters
+
+def get_sort(model):
+    # ?sort=population or ?sort=-population, one indexed non nullable column,
+    # the id breaks ties so the keyset cursor stays exact
+    sort = request.args.get('sort')
+    if not sort:
+        return None
+    descending = sort.startswith('-')
+    name = sort.lstrip('-')
+    allowed = {name for name in indexed_columns(model) if not model.__table__.c[name].nullable}
+    if name not in allowed:
+        raise APIException('Orden no permitido, columnas validas: ' + ', '.join(sorted(allowed)), status_code=400)
+    if name == 'id' and not descending:
+        return None
+    return model.__table__.c[name], descending
+
+def order_query(query, model, sort):
+    if sort is None:
+        return query.order_by(model.id)
+    column, descending = sort
+    return query.order_by(column.desc() if descending else column, model.id)
+
+def paginate(query, model, sort=None):
+    # Keyset pagination: WHERE id > :after ORDER BY id LIMIT n, or with a sort
+    # column WHERE (col, id) comes after the cursor ORDER BY col, id. One extra
+    # row is fetched to know if there is a next page without a COUNT
+    after, limit = get_page_args()
+    if after is not None:
+        if sort is None:
+            if not isinstance(after, int):
+                raise APIException('Cursor invalido', status_code=400)
+            query = query.filter(model.id > after)
+        else:
+            if not isinstance(after, list) or len(after) != 2:
+                raise APIException('Cursor invalido', status_code=400)
+            column, descending = sort
+            value, last_id = after
+            # The cursor comes from the client: its values must match the
+            # column types before they reach the SQL comparison
+            try:
+                value = parse_value(column, value)
+            except APIException:
+                raise APIException('Cursor invalido', status_code=400)
+            if not isinstance(last_id, int) or (isinstance(column.type, String) and not isinstance(value, str)):
+                raise APIException('Cursor invalido', status_code=400)
+            beyond = column < value if descending else column > value
+            query = query.filter(or_(beyond, and_(column == value, model.id > last_id)))
+    items = order_query(query, model, sort).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        if sort is None:
+            next_cursor = encode_cursor(last.id)
+        else:
+            next_cursor = encode_cursor([getattr(last, sort[0].name), last.id])
+    return items, next_cursor
+
+def serialize_instance(item):
+    return item.serialize()
+
+def paginated_response(query, model, serialize=serialize_instance, sort=None):
+    items, next_cursor = paginate(query, model, sort)
+    response = jsonify([serialize(item) for item in items])
+
+    if next_cursor is not None:
+        args = dict(request.args)
+        args['after'] = next_cursor
+        next_url = url_for(request.endpoint, **(request.view_args or {}), **args)
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = '<' + next_url + '>; rel="next"'
+    return response
+
+def stream_format():
+    # ?stream=ndjson or Accept: application/x-ndjson -> one object per line
+    # ?stream=1 -> a regular JSON array written in chunks
+    stream = request.args.get('stream')
+    if stream == 'ndjson' or request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return 'ndjson'
+    if stream in ('1', 'true', 'json'):
+        return 'json'
+    return None
+
+def iter_rows(query, model, serialize=serialize_instance, sort=None):
+    # yield_per keeps a server-side cursor open and hydrates STREAM_BATCH_SIZE
+    # rows at a time, so memory stays flat whatever the table size
+    for item in order_query(query, model, sort).yield_per(STREAM_BATCH_SIZE):
+        yield serialize(item)
+
+def stream_response(query, model, format, serialize=serialize_instance, sort=None):
+    dumps = current_app.json.dumps
+
+    def generate_ndjson():
+        for row in iter_rows(query, model, serialize, sort):
+            yield dumps(row) + '\n'
+
+    def generate_json():
+        yield '['
+        separator = ''
+        for row in iter_rows(query, model, serialize, sort):
+            yield separator + dumps(row)
+            separator = ','
+        yield ']'
+
+    if format == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype=NDJSON_MIMETYPE)
+    return Response(stream_with_context(generate_json()), mimetype='application/json')
+
+def list_response(query, model, serialize=serialize_instance, sort=None):
+    # `query` can return ORM instances (default serializer: item.serialize())
+    # or column rows together with a serializer from serializers.py
+    format = stream_format()
+    if format is not None:
+        return stream_response(query, model, format, serialize, sort)
+    return paginated_response(query, model, serialize, sort)
+
+def validate_fields(model, body):
+    # Values for every column but the primary key and the counters, checked
+    # against the column metadata: required, type and max length
+    if not isinstance(body, dict):
+        return None, 'Se esperaba un objeto'
+    values = {}
+    for column in model.__table__.columns:
+        if column.primary_key or column.info.get('counter'):
+            continue
+        name = column.name
+        value = body.get(name)
+        if value is None:
+            if not column.nullable:
+                return None, 'Falta el campo ' + name
+        elif isinstance(column.type, Integer):
+            if not isinstance(value, int) or isinstance(value, bool):
+                return None, 'El campo ' + name + ' debe ser un entero'
+        elif isinstance(column.type, String):
+            if not isinstance(value, str):
+                return None, 'El campo ' + name + ' debe ser un texto'
+            if column.type.length is not None and len(value) > column.type.length:
+                return None, 'El campo ' + name + ' supera los ' + str(column.type.length) + ' caracteres'
+        values[name] = value
+    return values, None
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
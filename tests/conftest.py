@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The app reads DATABASE_URL when it is imported, and src/ modules import
+# each other by name (like `flask run` from src/ does)
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="tests-"), "test.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + DATABASE_PATH
+os.environ.setdefault("ADMIN_MODE", "off")
+os.environ.setdefault("CACHE_TTL", "0")
+os.environ.setdefault("PASSWORD_COST", "10")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from app import app as flask_app
+from models import db
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
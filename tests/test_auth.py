@@ -0,0 +1,39 @@
+import pytest
+from models import db, User
+from passwords import needs_rehash, verify_password
+
+def signup(client, password):
+    return client.post("/signup", json={"first_name": "Luke", "last_name": "Skywalker", "email": "luke@example.com",
+                                        "username": "luke", "password": password})
+
+def test_signup_and_login(client):
+    assert signup(client, "usetheforce").status_code == 200
+
+    response = client.post("/login", json={"username": "luke", "password": "usetheforce"})
+
+    assert response.status_code == 200
+    assert "access_token" in response.json
+
+@pytest.mark.parametrize("password", [123, None, ["usetheforce"], {"a": 1}])
+def test_non_string_passwords(client, password):
+    assert signup(client, password).status_code == 400
+
+    signup(client, "usetheforce")
+    response = client.post("/login", json={"username": "luke", "password": password})
+
+    assert response.status_code == 401
+
+@pytest.mark.parametrize("stored", ["scrypt$", "scrypt$x$8$1$c2FsdA==$aGFzaA==", "scrypt$10$8$1$c2FsdA$aGFzaA==", "scrypt$10$8$1$a$b$c"])
+def test_malformed_stored_hash_fails_the_check(stored):
+    assert verify_password("usetheforce", stored) is False
+
+@pytest.mark.parametrize("stored", ["scrypt$", "scrypt$x$8$1$c2FsdA==$aGFzaA==", "scrypt$10$8$1$a$b$c"])
+def test_malformed_stored_hash_needs_rehash(stored):
+    assert needs_rehash(stored) is True
+
+def test_malformed_stored_hash_is_a_failed_login(client):
+    signup(client, "usetheforce")
+    User.query.filter_by(username="luke").update({"password": "scrypt$10$8$1$nope"})
+    db.session.commit()
+
+    assert client.post("/login", json={"username": "luke", "password": "usetheforce"}).status_code == 401
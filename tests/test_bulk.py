@@ -0,0 +1,30 @@
+from models import db, Planet, People
+from test_resources import add_planets, planet_values, people_values
+
+def test_bulk_update_reports_taken_names(client):
+    add_planets("Tatooine", "Alderaan", "Hoth")
+
+    response = client.put("/planets/bulk", json=[
+        dict(planet_values("Tatooine"), id=2),
+        dict(planet_values("Hoth"), id=3, population=1),
+        dict(planet_values("Dagobah"), id=1),
+        dict(planet_values("Dagobah"), id=2)
+    ])
+
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json["results"]] == [400, 200, 200, 400]
+    assert response.json["changed"] == 2
+    assert [planet.name for planet in Planet.query.order_by(Planet.id)] == ["Dagobah", "Alderaan", "Hoth"]
+
+def test_bulk_constraint_errors_are_bad_requests(client):
+    add_planets("Tatooine")
+
+    response = client.post("/people/bulk", json=[people_values("Luke Skywalker", 1), people_values("Leia Organa", 99)])
+    assert response.status_code == 400
+    assert People.query.count() == 0
+
+    client.post("/people/bulk", json=[people_values("Luke Skywalker", 1)])
+    response = client.put("/people/bulk", json=[dict(people_values("Luke Skywalker", 99), id=1)])
+    assert response.status_code == 400
+    db.session.expire_all()
+    assert People.query.get(1).planet_id == 1
@@ -0,0 +1,58 @@
+import pytest
+from cache import cache, CacheBackend, LRUCache
+from models import db, Planet, bump_table_version
+
+@pytest.fixture
+def cached(monkeypatch):
+    monkeypatch.setattr(cache, "ttl", 60)
+    monkeypatch.setattr(cache, "backend", LRUCache())
+
+def add_planet():
+    db.session.add(Planet(name="Tatooine", diameter=10465, rotation_period=23, orbital_period=304, gravity="1",
+                          population=200000, climate="arid", terrain="desert", surface_water=1))
+    bump_table_version("planet")
+    db.session.commit()
+
+def write_from_another_worker():
+    # Commits and bumps table_version without touching this process' cache
+    Planet.query.filter_by(id=1).update({"population": 120000})
+    bump_table_version("planet")
+    db.session.commit()
+
+@pytest.mark.parametrize("path", ["/planets/1", "/planets"])
+def test_write_by_another_worker_is_not_served_from_cache(client, cached, path):
+    add_planet()
+    etag = client.get(path).headers["ETag"]
+    assert client.get(path).headers["ETag"] == etag
+
+    write_from_another_worker()
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    body = response.json if path == "/planets/1" else response.json[0]
+    assert body["population"] == 120000
+    assert client.get(path, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+def test_incomplete_backend_fails_when_created():
+    class GetOnly(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+
+@pytest.mark.parametrize("path", ["/planets/1", "/planets"])
+def test_field_sets_are_cached_apart(client, cached, path):
+    add_planet()
+
+    sparse = client.get(path + "?fields=name")
+    full = client.get(path)
+    reordered = client.get(path + "?fields=population,name")
+
+    def first(response):
+        return response.json if path == "/planets/1" else response.json[0]
+    assert first(sparse) == {"name": "Tatooine"}
+    assert first(full)["diameter"] == 10465
+    assert first(reordered) == {"name": "Tatooine", "population": 200000}
+    assert first(client.get(path + "?fields=name")) == {"name": "Tatooine"}
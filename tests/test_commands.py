@@ -0,0 +1,30 @@
+import json
+from models import Planet, get_table_version
+from test_resources import planet_values
+
+def write_ndjson(tmp_path, lines):
+    path = tmp_path / "planets.ndjson"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+def test_load_catalog_skips_existing_names(app, tmp_path):
+    path = write_ndjson(tmp_path, [json.dumps(planet_values(name)) for name in ("Tatooine", "Hoth", "Hoth")])
+    runner = app.test_cli_runner()
+
+    first = runner.invoke(args=["load-catalog", path, "--model", "planet", "--batch-size", "2"])
+    second = runner.invoke(args=["load-catalog", path, "--model", "planet"])
+
+    assert first.exit_code == 0 and "1 ya existian" in first.output
+    assert second.exit_code == 0 and "Cargadas 0 filas" in second.output
+    assert sorted(planet.name for planet in Planet.query) == ["Hoth", "Tatooine"]
+
+def test_load_catalog_bumps_the_version_per_batch(app, tmp_path):
+    path = write_ndjson(tmp_path, [json.dumps(planet_values("Tatooine")), json.dumps(planet_values("Hoth")), "{no es json"])
+
+    result = app.test_cli_runner().invoke(args=["load-catalog", path, "--model", "planet", "--batch-size", "1"])
+
+    assert result.exit_code != 0
+    assert "Linea 3" in result.output
+    # Both committed batches changed the version the ETags come from
+    assert Planet.query.count() == 2
+    assert get_table_version("planet").version == 2
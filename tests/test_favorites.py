@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import event
+from models import db, User, Planet, People, Vehicle, Favorite
+
+def add_user_with_favorites(count):
+    user = User(first_name="Luke", last_name="Skywalker", email="luke@example.com", password="x", username="luke")
+    db.session.add(user)
+    for number in range(count):
+        planet = Planet(name="planet {}".format(number), diameter=1, rotation_period=1, orbital_period=1, gravity="1",
+                        population=1, climate="arid", terrain="desert", surface_water=1)
+        people = People(name="people {}".format(number), height=1, mass=1, hair_color="blond", skin_color="fair",
+                        eye_color="blue", birth_year="19BBY", gender="male", planet=planet)
+        vehicle = Vehicle(name="vehicle {}".format(number), model="T-16", vehicle_class="airspeeder", manufacturer="Incom",
+                          cost_in_credits=1, length=1, crew=1, passengers=1, max_atmospheric_speed=1, cargo_capacity=1, consumables="0")
+        db.session.add_all([
+            Favorite(user=user, planet=planet),
+            Favorite(user=user, people=people),
+            Favorite(user=user, vehicle=vehicle)
+        ])
+    db.session.commit()
+    return user.id
+
+def count_statements(client, path):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    return response, statements
+
+@pytest.mark.parametrize("count", [1, 25])
+def test_expanded_favorites_statement_count(client, count):
+    user_id = add_user_with_favorites(count)
+    db.session.expunge_all()
+
+    response, statements = count_statements(client, "/users/{}/favorite?expand=1".format(user_id))
+
+    assert response.status_code == 200
+    assert len(response.json) == count * 3
+    # The user lookup and one joined SELECT, however many favorites there are
+    assert len(statements) == 2
+
+def test_expanded_favorites_include_targets(client):
+    user_id = add_user_with_favorites(1)
+
+    response = client.get("/users/{}/favorite?expand=1".format(user_id))
+
+    favorites = {favorite["id"]: favorite for favorite in response.json}
+    planet = next(favorite for favorite in favorites.values() if favorite["planet_id"] is not None)
+    assert planet["planet"]["name"] == "planet 0"
+    assert planet["people"] is None and planet["vehicle"] is None
+    vehicle = next(favorite for favorite in favorites.values() if favorite["vehicle_id"] is not None)
+    assert vehicle["vehicle"]["name"] == "vehicle 0"
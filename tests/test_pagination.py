@@ -0,0 +1,30 @@
+import pytest
+from utils import encode_cursor
+from test_resources import add_planets
+
+@pytest.mark.parametrize("after", ["%C2%B2", "abc", "1x"])
+def test_invalid_cursor_is_a_bad_request(client, after):
+    add_planets("Tatooine")
+
+    response = client.get("/planets?after=" + after)
+
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("cursor", [["mucho", 1], [1000, "1"], [None, 1], [1000]])
+def test_sorted_cursor_values_are_checked(client, cursor):
+    add_planets("Tatooine")
+
+    response = client.get("/planets?sort=population&after=" + encode_cursor(cursor))
+
+    assert response.status_code == 400
+
+def test_keyset_pages(client):
+    add_planets("Alderaan", "Hoth", "Tatooine")
+
+    first = client.get("/planets?limit=2")
+    second = client.get("/planets?limit=2&after=" + first.headers["X-Next-Cursor"])
+
+    assert [planet["name"] for planet in first.json] == ["Alderaan", "Hoth"]
+    assert [planet["name"] for planet in second.json] == ["Tatooine"]
+    assert "X-Next-Cursor" not in second.headers
+    assert client.get("/planets?limit=2&after=2").json == second.json
@@ -0,0 +1,39 @@
+from models import db, Planet, People, bump_table_version
+
+def planet_values(name):
+    return {"name": name, "diameter": 10465, "rotation_period": 23, "orbital_period": 304, "gravity": "1",
+            "population": 200000, "climate": "arid", "terrain": "desert", "surface_water": 1}
+
+def people_values(name, planet_id=None):
+    return {"name": name, "height": 172, "mass": 77, "hair_color": "blond", "skin_color": "fair",
+            "eye_color": "blue", "birth_year": "19BBY", "gender": "male", "planet_id": planet_id}
+
+def add_planets(*names):
+    db.session.add_all([Planet(**planet_values(name)) for name in names])
+    bump_table_version("planet")
+    db.session.commit()
+
+def test_put_with_a_taken_name_is_a_bad_request(client):
+    add_planets("Tatooine", "Alderaan")
+
+    response = client.put("/planets/2", json=planet_values("Tatooine"))
+
+    assert response.status_code == 400
+    assert client.get("/planets/2").json["name"] == "Alderaan"
+
+def test_missing_foreign_key_is_a_bad_request(client):
+    add_planets("Tatooine")
+    client.post("/people", json=people_values("Luke Skywalker", 1))
+
+    assert client.post("/people", json=people_values("Leia Organa", 99)).status_code == 400
+    assert client.put("/people/1", json=people_values("Luke Skywalker", 99)).status_code == 400
+    assert People.query.count() == 1
+    assert client.get("/people/1").json["planet_id"] == 1
+
+def test_failed_write_keeps_the_table_version(client):
+    add_planets("Tatooine", "Alderaan")
+    etag = client.get("/planets").headers["ETag"]
+
+    client.put("/planets/2", json=planet_values("Tatooine"))
+
+    assert client.get("/planets").headers["ETag"] == etag
@@ -0,0 +1,13 @@
+from test_resources import add_planets
+
+def test_search_without_fts_table_falls_back_to_names(client):
+    # conftest builds the schema with db.create_all(), there is no search_index
+    add_planets("Tatooine", "Hoth", "Taris")
+
+    response = client.get("/search?q=ta")
+
+    assert response.status_code == 200
+    assert [result["name"] for result in response.json] == ["Taris", "Tatooine"]
+
+def test_search_needs_two_characters(client):
+    assert client.get("/search?q=t").status_code == 400